@@ -0,0 +1,195 @@
+import os
+import re
+import sys
+import tempfile
+import time
+import JackParser
+import JackTokenizer
+
+
+SIZES = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+SCALES = [1, 10, 100, 1000]
+FIXTURES = ["Square/Square.jack", "Square/SquareGame.jack",
+            "ExpressionLessSquare/Square.jack", "ExpressionLessSquare/SquareGame.jack"]
+
+SAMPLE = '''/** Synthetic class body used for timing. */
+    function int step(int x, int y) {
+        var int i; // loop counter
+        let i = 0;
+        /* keep the string with a // inside it */
+        do Output.printString("step // not a comment");
+        while (i < x) {
+            let y = y + (i * 2) - 1;
+            let i = i + 1;
+        }
+        return y;
+    }
+'''
+
+# Inputs with only one of the two characters the comment scan looks for, so
+# a search that runs to the end of the piece on every step would show up
+COMMENT_SAMPLE = '''        let x = a / b; // divide
+        /* block comment */ let y = x / 2;
+'''
+STRING_SAMPLE = '''        do Output.printString("no comments here");
+'''
+SAMPLES = {"mixed": SAMPLE, "comments only": COMMENT_SAMPLE, "strings only": STRING_SAMPLE}
+
+
+def syntheticJack(size, sample=SAMPLE):
+    """
+    Builds a Jack class of roughly size characters by repeating sample, by
+    default a subroutine that mixes code, line comments, block comments and
+    strings.
+
+    input: size (int), sample (string)
+    returns: string
+    """
+    copies = max(1, -(-size // len(sample)))
+    return "class Bench {\n" + sample * copies + "}\n"
+
+
+def timeRemoveComments(source):
+    """
+    Times a single JackTokenizer.removeComments pass over source without
+    touching the file system.
+
+    input: source (string)
+    returns: float seconds
+    """
+    tokenizer = JackTokenizer.JackTokenizer.__new__(JackTokenizer.JackTokenizer)
+    tokenizer.lines = source
+    start = time.perf_counter()
+    tokenizer.removeComments()
+    return time.perf_counter() - start
+
+
+def benchRemoveComments():
+    """
+    Prints wall time of removeComments against file size from 1 KB to 10 MB,
+    for each input in SAMPLES.
+    """
+    for name, sample in SAMPLES.items():
+        print(f"removeComments ({name})")
+        print(f"{'bytes':>12} {'seconds':>10} {'MB/s':>10}")
+        for size in SIZES:
+            source = syntheticJack(size, sample)
+            seconds = timeRemoveComments(source)
+            rate = len(source) / seconds / 1e6 if seconds else float("inf")
+            print(f"{len(source):>12} {seconds:>10.4f} {rate:>10.1f}")
+
+
+def benchTokenize():
+    """
+    Prints wall time of JackTokenizer.tokenize against file size.
+    """
+    print("tokenize")
+    print(f"{'bytes':>12} {'tokens':>10} {'seconds':>10} {'MB/s':>10}")
+    for size in SIZES:
+        tokenizer = JackTokenizer.JackTokenizer.__new__(JackTokenizer.JackTokenizer)
+        tokenizer.lines = syntheticJack(size)
+        tokenizer.removeComments()
+        start = time.perf_counter()
+        tokens = tokenizer.tokenize()
+        seconds = time.perf_counter() - start
+        rate = len(tokenizer.lines) / seconds / 1e6 if seconds else float("inf")
+        print(f"{len(tokenizer.lines):>12} {len(tokens):>10} {seconds:>10.4f} {rate:>10.1f}")
+
+
+def scaledJack(path, scale):
+    """
+    Repeats the subroutines of a fixture class scale times while keeping its
+    class variable declarations once, so the result still parses.
+
+    input: path (string), scale (int)
+    returns: string
+    """
+    tokenizer = JackTokenizer.JackTokenizer.__new__(JackTokenizer.JackTokenizer)
+    with open(path) as f:
+        tokenizer.lines = f.read()
+    tokenizer.removeComments()
+    source = tokenizer.lines
+    open_brace = source.index("{")
+    close_brace = source.rindex("}")
+    first = re.search(r"\b(constructor|function|method)\b", source[open_brace:])
+    split_at = open_brace + first.start()
+    header = source[:split_at]
+    subroutines = source[split_at:close_brace]
+    return header + subroutines * scale + "}\n"
+
+
+def timeParse(source):
+    """
+    Times tokenizing and parsing source with CompilationEngine. The XML goes
+    to os.devnull so only the front end is measured.
+
+    input: source (string)
+    returns: tuple[float seconds, int tokens]
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".jack", delete=False) as f:
+        f.write(source)
+    try:
+        start = time.perf_counter()
+        comp = JackParser.CompilationEngine(f.name, os.devnull)
+        tokens = len(comp.tokenizer.tokens)
+        comp.compileClass()
+        seconds = time.perf_counter() - start
+        comp.tokenizer.file.close()
+    finally:
+        os.remove(f.name)
+    return seconds, tokens
+
+
+def benchParse():
+    """
+    Prints parse time for the Square and ExpressionLessSquare fixtures scaled
+    up to 1000x. A flat microseconds-per-token column means linear time.
+    """
+    print("CompilationEngine.compileClass")
+    print(f"{'fixture':<38} {'scale':>6} {'tokens':>9} {'seconds':>9} {'us/token':>9}")
+    for fixture in FIXTURES:
+        for scale in SCALES:
+            seconds, tokens = timeParse(scaledJack(fixture, scale))
+            print(f"{fixture:<38} {scale:>6} {tokens:>9} {seconds:>9.4f} "
+                  f"{seconds / tokens * 1e6:>9.2f}")
+
+
+def benchXml():
+    """
+    Prints the time to compile the Square fixtures, including writing the 
+    xml parse tree to a real file, at 1x and 100x scale.
+    """
+    print("Compile to xml")
+    print(f"{'fixture':<38} {'scale':>6} {'seconds':>9}")
+    for fixture in FIXTURES:
+        for scale in (1, 100):
+            with tempfile.NamedTemporaryFile("w", suffix=".jack", delete=False) as f:
+                f.write(scaledJack(fixture, scale))
+            output = f.name[:-len(".jack")] + ".xml"
+            try:
+                best = float("inf")
+                for _ in range(3):
+                    start = time.perf_counter()
+                    comp = JackParser.CompilationEngine(f.name, output)
+                    comp.compileClass()
+                    best = min(best, time.perf_counter() - start)
+                    comp.tokenizer.file.close()
+            finally:
+                os.remove(f.name)
+                os.remove(output)
+            print(f"{fixture:<38} {scale:>6} {best:>9.4f}")
+
+
+BENCHMARKS = {"comments": benchRemoveComments, "tokenize": benchTokenize,
+              "parse": benchParse, "xml": benchXml}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        BENCHMARKS[name]()
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import JackAST
+import JackCompiler
+import JackOptimizer
+import JackParser
+import JackTokenizer
+import SymbolTable
+import VMWriter
+import XMLWriter
+
+
+COMPILER_MODULES = [JackTokenizer, JackParser, XMLWriter, JackAST, JackCompiler, SymbolTable,
+                    VMWriter, JackOptimizer]
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def compilerVersion():
+    """
+    Hashes the source of the compiler modules, so editing the compiler makes
+    every cached output stale without anyone bumping a version number.
+
+    returns: string
+    """
+    digest = hashlib.sha256()
+    for module in COMPILER_MODULES:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class BuildCache:
+
+    def __init__(self, directory, maxBytes=DEFAULT_MAX_BYTES, version=None):
+        """
+        Initializes an on disk cache of compiled outputs.
+
+        Args:
+            directory (string): Folder holding the cached outputs.
+            maxBytes (int): Total size the cache is trimmed back to after
+                each store. Least recently used entries go first.
+            version (string): Compiler version mixed into every key.
+
+        Attributes:
+            hits (int): Number of outputs restored from the cache.
+            misses (int): Number of lookups that found nothing.
+        """
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.version = version if version is not None else compilerVersion()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, sourceFile, suffix):
+        """
+        Returns the cache key for compiling sourceFile into a suffix output
+        (".xml" or ".vm"): a hash of the compiler version, the suffix and
+        the file contents.
+
+        input: sourceFile (string), suffix (string)
+        returns: string
+        """
+        digest = hashlib.sha256()
+        digest.update(self.version.encode())
+        digest.update(suffix.encode())
+        with open(sourceFile, 'rb') as f:
+            digest.update(f.read())
+        return digest.hexdigest() + suffix
+
+    def path(self, key):
+        """
+        Returns the path of the cache entry for key.
+        """
+        return os.path.join(self.directory, key)
+
+    def restore(self, key, outputFile):
+        """
+        Copies the cached output for key to outputFile and marks the entry as
+        recently used.
+
+        input: key (string), outputFile (string)
+        returns: bool: whether there was an entry to restore
+        """
+        entry = self.path(key)
+        try:
+            shutil.copyfile(entry, outputFile)
+            os.utime(entry)
+        except FileNotFoundError:
+            self.misses += 1
+            return False
+        self.hits += 1
+        return True
+
+    def store(self, key, outputFile):
+        """
+        Saves outputFile as the entry for key, then evicts old entries until
+        the cache fits in maxBytes. The copy is renamed into place so other
+        processes never see half written entries.
+
+        input: key (string), outputFile (string)
+        returns: None
+        """
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        os.close(fd)
+        shutil.copyfile(outputFile, temp)
+        os.replace(temp, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        Removes least recently used entries until the total size of the
+        cache is at most maxBytes.
+
+        returns: None
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if name.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(self.path(name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+            total += stat.st_size
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+            total -= size
@@ -1,28 +1,144 @@
-import sys
+import argparse
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import BuildCache
+import JackAST
+import JackCompiler
+import JackOptimizer
 import JackParser
 
 
+def compileFile(jackFile, outFile, stream=False, vm=False, ast=False, optimize=False, sourceMap=False):
+    """
+    Compiles one .jack file into its xml parse tree, or into vm code when vm
+    is set. With ast the file is parsed into an in memory tree first and the
+    output is written by walking it. optimize folds constant expressions in
+    that tree first. sourceMap also writes outFile + ".map" tracing each vm
+    line back to its Jack line. Runs in a worker process when compiling with
+    --jobs, so it only takes plain arguments.
+
+    input: jackFile (string), outFile (string), stream (bool), vm (bool),
+           ast (bool), optimize (bool), sourceMap (bool)
+    returns: None
+    """
+    if ast or optimize:
+        root = JackAST.parse(jackFile, stream)
+        if optimize:
+            JackOptimizer.ConstantFolder().fold(root)
+        if vm:
+            JackCompiler.VMTreeWriter(outFile).write(root)
+        else:
+            JackAST.XMLTreeWriter(outFile).write(root)
+        return
+    if vm:
+        comp = JackCompiler.VMCompilationEngine(jackFile, outFile, stream, sourceMap)
+    else:
+        comp = JackParser.CompilationEngine(jackFile, outFile, stream)
+    comp.compileClass()
+
+
+def compileAll(jobs, workers, stream=False, cache=None, vm=False, ast=False, optimize=False,
+               sourceMap=False):
+    """
+    Compiles each (jackFile, outFile) pair in jobs, in a process pool when
+    workers is more than 1. Failures are reported per file in the order of
+    jobs, whichever process finishes first.
+
+    With a cache, files whose contents were compiled before by the same 
+    compiler get their output restored from it instead, and freshly compiled 
+    outputs are added to it.
+
+    input: jobs (list[tuple[string, string]]), workers (int), stream (bool),
+           cache (BuildCache.BuildCache or None), vm (bool), ast (bool),
+           optimize (bool), sourceMap (bool)
+    returns: list[tuple[string, Exception]] of the files that failed
+    """
+    keys = {}
+    if cache is not None:
+        pending = []
+        suffix = (".vm" if vm else ".xml") + (".O" if optimize else "")
+        for jackFile, outFile in jobs:
+            key = cache.key(jackFile, suffix)
+            if not cache.restore(key, outFile):
+                keys[jackFile] = key
+                pending.append((jackFile, outFile))
+        jobs = pending
+
+    failures = []
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(compileFile, jackFile, outFile, stream, vm, ast, optimize, sourceMap)
+                       for jackFile, outFile in jobs]
+            for (jackFile, _), future in zip(jobs, futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    failures.append((jackFile, e))
+    else:
+        for jackFile, outFile in jobs:
+            try:
+                compileFile(jackFile, outFile, stream, vm, ast, optimize, sourceMap)
+            except Exception as e:
+                failures.append((jackFile, e))
+
+    if cache is not None:
+        failed = {jackFile for jackFile, _ in failures}
+        for jackFile, outFile in jobs:
+            if jackFile not in failed:
+                cache.store(keys[jackFile], outFile)
+    return failures
+
+
 def main():
-    userInput = sys.argv[1]
+    parser = argparse.ArgumentParser(description="Compiles .jack files into xml parse trees or vm code.")
+    parser.add_argument("input", help="a .jack file or a directory of .jack files")
+    parser.add_argument("--vm", action="store_true",
+                        help="write .vm code instead of the .xml parse tree")
+    parser.add_argument("--ast", action="store_true",
+                        help="parse into an in memory tree and write the output by walking it")
+    parser.add_argument("--optimize", "-O", action="store_true",
+                        help="fold constant expressions before writing (implies --ast)")
+    parser.add_argument("--stream", action="store_true",
+                        help="read tokens on demand instead of loading the whole file")
+    parser.add_argument("--jobs", "-j", type=int, default=1, metavar="N",
+                        help="compile up to N files at once in separate processes")
+    parser.add_argument("--source-map", action="store_true",
+                        help="with --vm, also write a .vm.map tracing each vm line to its Jack line")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="reuse outputs of unchanged files from a build cache in DIR")
+    parser.add_argument("--cache-size", type=int, default=BuildCache.DEFAULT_MAX_BYTES,
+                        metavar="BYTES", help="size the build cache is trimmed to (LRU)")
+    args = parser.parse_args()
+    if args.source_map and (not args.vm or args.ast or args.optimize or args.stream or args.cache):
+        parser.error("--source-map needs --vm and cannot be used with --ast, --optimize, --stream or --cache")
+    userInput = args.input
+    suffix = ".vm" if args.vm else ".xml"
 
     if os.path.isdir(userInput):
         if not userInput.endswith("/"):
             userInput += "/"
-        files = os.listdir(userInput)
+        files = sorted(os.listdir(userInput))
+        jobs = []
         for file in files:
             if file.endswith('.jack'):
                 fileName = file.split(".")[0]
-                comp = JackParser.CompilationEngine(userInput + file, userInput + fileName + ".xml")
-                comp.compileClass()
+                jobs.append((userInput + file, userInput + fileName + suffix))
     #Case input is file, just parse it
     elif os.path.isfile(userInput):
         userInput = userInput.split(".")[0]
-        comp = JackParser.CompilationEngine(userInput + ".jack", userInput + ".xml")
-        comp.compileClass()
+        jobs = [(userInput + ".jack", userInput + suffix)]
     #Raise an exception
     else:
         raise Exception("The input is not valid, please try again")
 
+    cache = BuildCache.BuildCache(args.cache, args.cache_size) if args.cache else None
+    failures = compileAll(jobs, args.jobs, args.stream, cache, args.vm, args.ast,
+                          args.optimize, args.source_map)
+    for jackFile, e in failures:
+        print(f"Error compiling {jackFile}: {type(e).__name__}: {e}", file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
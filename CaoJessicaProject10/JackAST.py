@@ -0,0 +1,155 @@
+import JackParser
+import XMLWriter
+
+
+class Node:
+
+    __slots__ = ("rule", "children")
+
+    def __init__(self, rule, children=None):
+        """
+        A non terminal of the parse tree, named like the xml tags
+        (class, letStatement, expression, ...). Terminals are kept as the
+        (token type, token value) tuples the tokenizer already made, so the
+        tree costs one small object per rule and nothing per token.
+
+        Attributes:
+            rule (string): Grammar rule name.
+            children (list): Nodes and token tuples in source order.
+        """
+        self.rule = rule
+        self.children = children if children is not None else []
+
+    def __repr__(self):
+        return f"Node({self.rule!r}, {self.children!r})"
+
+
+class TreeBuilder:
+
+    def __init__(self):
+        """
+        Stands in for XMLWriter inside CompilationEngine and builds the parse
+        tree in memory instead of writing text.
+
+        Attributes:
+            root (Node): The class node, once parsing is done.
+            stack (list): Nodes whose rule is still open.
+        """
+        self.root = None
+        self.stack = []
+
+    def startNonTerminal(self, rule):
+        """
+        Opens a new node for rule under the innermost open node.
+        """
+        node = Node(rule)
+        if self.stack:
+            self.stack[-1].children.append(node)
+        else:
+            self.root = node
+        self.stack.append(node)
+
+    def endNonTerminal(self):
+        """
+        Closes the innermost open node.
+        """
+        self.stack.pop()
+
+    def terminal(self, token, value):
+        """
+        Adds a token to the innermost open node.
+        """
+        self.stack[-1].children.append((token, value))
+
+    def close(self):
+        """
+        Nothing to flush, the tree stays in memory.
+        """
+
+
+class ASTCompilationEngine(JackParser.CompilationEngine):
+
+    def __init__(self, input, stream=False):
+        """
+        Creates a compilation engine that parses the input into a tree of
+        Nodes. After compileClass, the tree is in self.root.
+        """
+        super().__init__(input, None, stream)
+        self.root = None
+
+    def createWriter(self, output):
+        """
+        Uses a TreeBuilder in place of the xml writer.
+        """
+        return TreeBuilder()
+
+    def compileClass(self):
+        """
+        Parses a complete class into self.root.
+        """
+        super().compileClass()
+        self.root = self.writer.root
+        return self.root
+
+
+def parse(input, stream=False):
+    """
+    Parses a .jack file into its tree.
+
+    input: input (string), stream (bool)
+    returns: Node
+    """
+    return ASTCompilationEngine(input, stream).compileClass()
+
+
+class TreeWalker:
+
+    def walk(self, node):
+        """
+        Visits node by calling the method named after its rule, e.g.
+        visitLetStatement for letStatement, or visitDefault when there is
+        no such method.
+        """
+        rule = node.rule
+        method = getattr(self, "visit" + rule[0].upper() + rule[1:], None)
+        if method is None:
+            return self.visitDefault(node)
+        return method(node)
+
+    def visitDefault(self, node):
+        """
+        Walks the child nodes of a rule the walker has no method for.
+        """
+        for child in node.children:
+            if type(child) is Node:
+                self.walk(child)
+
+
+class XMLTreeWriter(TreeWalker):
+
+    def __init__(self, output):
+        """
+        Writes a parse tree as the same xml the CompilationEngine writes.
+        """
+        self.writer = XMLWriter.XMLWriter(output)
+
+    def write(self, root):
+        """
+        Writes the whole tree and closes the file.
+        """
+        self.walk(root)
+        self.writer.close()
+
+    def visitDefault(self, node):
+        """
+        Writes a rule as an element holding its tokens and child rules.
+        """
+        writer = self.writer
+        writer.startNonTerminal(node.rule)
+        for child in node.children:
+            if type(child) is Node:
+                self.walk(child)
+            else:
+                writer.terminal(child[0], child[1])
+        writer.endNonTerminal()
+
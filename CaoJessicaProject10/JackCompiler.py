@@ -0,0 +1,634 @@
+import JackAST
+import JackParser
+import SymbolTable
+import VMWriter
+
+
+class VMGenerator:
+
+    binaryCommands = {'+': 'add', '-': 'sub', '&': 'and', '|': 'or',
+                      '<': 'lt', '>': 'gt', '=': 'eq'}
+    binaryCalls = {'*': 'Math.multiply', '/': 'Math.divide'}
+    unaryCommands = {'-': 'neg', '~': 'not'}
+
+    def initGenerator(self):
+        """
+        Sets up the state shared by both vm backends.
+
+        Attributes:
+            classTable (SymbolTable): static and field variables
+            subroutineTable (SymbolTable): args and locals of the current
+                subroutine
+            className (string): Name of the class being compiled
+            labelCount (int): Number of labels handed out in this class
+        """
+        self.classTable = SymbolTable.SymbolTable()
+        self.subroutineTable = SymbolTable.SymbolTable()
+        self.className = ""
+        self.subroutineKind = ""
+        self.subroutineName = ""
+        self.labelCount = 0
+
+    def newLabel(self):
+        """
+        Returns a fresh label of the form ClassName_K for the Kth label of
+        the class.
+        """
+        label = f"{self.className}_{self.labelCount}"
+        self.labelCount += 1
+        return label
+
+    def lookup(self, name):
+        """
+        Returns the symbol table that defines name, looking in the current
+        subroutine first, or None for class and subroutine names.
+        """
+        if name in self.subroutineTable:
+            return self.subroutineTable
+        if name in self.classTable:
+            return self.classTable
+        return None
+
+    def pushVariable(self, name):
+        """
+        Pushes the value of a variable onto the stack.
+        """
+        table = self.lookup(name)
+        if table is None:
+            raise Exception(f"{self.className}.{self.subroutineName}: undefined variable {name}")
+        self.writer.writePush(table.segmentOf(name), table.indexOf(name))
+
+    def popVariable(self, name):
+        """
+        Pops the top of the stack into a variable.
+        """
+        table = self.lookup(name)
+        if table is None:
+            raise Exception(f"{self.className}.{self.subroutineName}: undefined variable {name}")
+        self.writer.writePop(table.segmentOf(name), table.indexOf(name))
+
+    def writeSubroutineStart(self):
+        """
+        Writes the function line once all local variables are known, then
+        has constructors allocate the object and methods set up this.
+        """
+        self.writer.writeFunction(f"{self.className}.{self.subroutineName}",
+                                  self.subroutineTable.varCount("var"))
+        if self.subroutineKind == "constructor":
+            self.writer.writePush("constant", self.classTable.varCount("field"))
+            self.writer.writeCall("Memory.alloc", 1)
+            self.writer.writePop("pointer", 0)
+        elif self.subroutineKind == "method":
+            self.writer.writePush("argument", 0)
+            self.writer.writePop("pointer", 0)
+
+    def startCall(self, name, subroutine):
+        """
+        Works out the function a call goes to. Calls on a variable push the
+        object as the first argument, and unqualified calls are methods of
+        this.
+
+        input: name (string), subroutine (string or None if unqualified)
+        returns: tuple[string, int]: full function name and the number of
+                 arguments pushed so far
+        """
+        if subroutine is None:
+            self.writer.writePush("pointer", 0)
+            return f"{self.className}.{name}", 1
+        table = self.lookup(name)
+        if table is not None:
+            self.writer.writePush(table.segmentOf(name), table.indexOf(name))
+            return f"{table.typeOf(name)}.{subroutine}", 1
+        return f"{name}.{subroutine}", 0
+
+    def writeArrayStore(self):
+        """
+        Stores the value on top of the stack at the address below it.
+        """
+        self.writer.writePop("temp", 0)
+        self.writer.writePop("pointer", 1)
+        self.writer.writePush("temp", 0)
+        self.writer.writePop("that", 0)
+
+    def writeArrayLoad(self):
+        """
+        Replaces the address on top of the stack with the value stored there.
+        """
+        self.writer.writePop("pointer", 1)
+        self.writer.writePush("that", 0)
+
+    def writeBinaryOp(self, op):
+        """
+        Writes the vm code for a binary operator. * and / have no vm command
+        and call into the Math class.
+        """
+        if op in self.binaryCalls:
+            self.writer.writeCall(self.binaryCalls[op], 2)
+        else:
+            self.writer.writeArithmetic(self.binaryCommands[op])
+
+    def writeString(self, string):
+        """
+        Builds a string constant with String.new and one String.appendChar
+        per character.
+        """
+        self.writer.writePush("constant", len(string))
+        self.writer.writeCall("String.new", 1)
+        for char in string:
+            self.writer.writePush("constant", ord(char))
+            self.writer.writeCall("String.appendChar", 2)
+
+    def writeKeywordConstant(self, keyword):
+        """
+        Pushes true (-1), false and null (0), or this.
+        """
+        if keyword == "true":
+            self.writer.writePush("constant", 1)
+            self.writer.writeArithmetic("neg")
+        elif keyword == "this":
+            self.writer.writePush("pointer", 0)
+        else:
+            self.writer.writePush("constant", 0)
+
+
+class VMCompilationEngine(VMGenerator, JackParser.CompilationEngine):
+
+    def __init__(self, input, output, stream=False, sourceMap=False):
+        """
+        Creates a compilation engine that writes vm code for the input file
+        straight from the recursive descent, without building the xml tree.
+        With sourceMap each vm line is traced to the line of the last token
+        read when it was written, and the map is saved as output + ".map".
+        Needs the whole token list, so it cannot be combined with stream.
+        """
+        super().__init__(input, output, stream)
+        self.initGenerator()
+        if sourceMap:
+            tokenizer = self.tokenizer
+            tokenLines = tokenizer.tokenLines()
+            self.writer.recordSourceMap(input, lambda: tokenLines[tokenizer.position - 1])
+
+    def createWriter(self, output):
+        """
+        Opens a vm writer instead of the xml writer.
+        """
+        return VMWriter.VMWriter(output)
+
+    def writeNonTerminalStart(self, rule):
+        """
+        There is no parse tree in vm output, so rules are not written.
+        """
+
+    def writeNonTerminalEnd(self):
+        """
+        There is no parse tree in vm output, so rules are not written.
+        """
+
+    def advance(self):
+        """
+        Moves to the next token and returns its value.
+        """
+        return self.tokenizer.advance()[1]
+
+    def compileClass(self):
+        """
+        Compiles a complete class.
+        """
+        self.advance()  # get 'class' keyword
+        self.className = self.advance()  # get class name
+        self.advance()  # get '{' symbol
+        if self.existClassVarDec():
+            self.compileClassVarDec()
+        while self.existSubroutine():
+            self.compileSubroutine()
+        self.advance()  # get '}' symbol
+        self.writer.close()
+
+    def writeClassVarDec(self):
+        """
+        Adds the variables of one class variable declaration to the class
+        symbol table.
+        """
+        kind = self.advance()  # get 'static' or 'field'
+        type = self.advance()  # get var type
+        self.classTable.define(self.advance(), type, kind)  # get var name
+        while self.nextValueIs(","):
+            self.advance()  # get ',' symbol
+            self.classTable.define(self.advance(), type, kind)  # get var name
+        self.advance()  # get ';' symbol
+
+    def compileSubroutine(self):
+        """
+        Compiles a complete method, function, or constructor.
+        """
+        self.subroutineTable.reset()
+        self.subroutineKind = self.advance()  # get subroutine type
+        self.advance()  # get subroutine return type / 'constructor'
+        self.subroutineName = self.advance()  # get subroutine name / 'new'
+        if self.subroutineKind == "method":
+            self.subroutineTable.define("this", self.className, "arg")
+        self.advance()  # get '(' symbol
+        self.compileParameterList()
+        self.advance()  # get ')' symbol
+        self.compileSubroutineBody()
+
+    def writeParam(self):
+        """
+        Adds a single parameter from a parameter list to the subroutine
+        symbol table.
+        """
+        type = self.advance()  # get parameter type
+        self.subroutineTable.define(self.advance(), type, "arg")  # get parameter name
+        if self.nextValueIs(","):
+            self.advance()  # get ',' symbol
+
+    def compileSubroutineBody(self):
+        """
+        Compiles the body of a subroutine declaration.
+        """
+        self.advance()  # get '{' symbol
+        while self.existVarDec():
+            self.compileVarDec()
+        self.writeSubroutineStart()
+        self.compileStatements()
+        self.advance()  # get '}' symbol
+
+    def compileVarDec(self):
+        """
+        Adds the variables of a variable declaration to the subroutine
+        symbol table.
+        """
+        self.advance()  # get 'var' keyword
+        type = self.advance()  # get var type
+        self.subroutineTable.define(self.advance(), type, "var")  # get var name
+        while self.nextValueIs(","):
+            self.advance()  # get ',' symbol
+            self.subroutineTable.define(self.advance(), type, "var")  # get var name
+        self.advance()  # get ';' symbol
+
+    def compileDo(self):
+        """
+        Compiles a do statement, throwing away the returned value.
+        """
+        self.advance()  # get 'do' keyword
+        self.compileSubroutineCall()
+        self.writer.writePop("temp", 0)
+        self.advance()  # get ';' symbol
+
+    def compileSubroutineCall(self):
+        """
+        Compiles a subroutine call.
+        """
+        self.writeCall(self.advance())  # get class/subroutine/var name
+
+    def writeCall(self, name):
+        """
+        Compiles the rest of a subroutine call once its first name has been
+        read.
+        """
+        subroutine = None
+        if self.nextValueIs("."):  # case of className.subroutineName
+            self.advance()  # get '.' symbol
+            subroutine = self.advance()  # get subroutine name
+        function, nArgs = self.startCall(name, subroutine)
+        self.advance()  # get '(' symbol
+        nArgs += self.compileExpressionList()
+        self.advance()  # get ')' symbol
+        self.writer.writeCall(function, nArgs)
+
+    def compileExpressionList(self):
+        """
+        Compiles a list of expressions, including separating commas.
+
+        returns: int: the number of expressions
+        """
+        count = 0
+        if self.existExpression():
+            self.compileExpression()
+            count += 1
+        while self.nextValueIs(","):  # case of multiple expressions
+            self.advance()  # get ',' symbol
+            self.compileExpression()
+            count += 1
+        return count
+
+    def compileLet(self):
+        """
+        Compiles a let statement. For varName[expression] the target address
+        is computed first and parked in temp while the value is computed.
+        """
+        self.advance()  # get 'let' keyword
+        name = self.advance()  # get var name
+        if self.nextValueIs("["):  # case of varName[expression]
+            self.writeArrayIndex()
+            self.pushVariable(name)
+            self.writer.writeArithmetic("add")
+            self.advance()  # get '='
+            self.compileExpression()
+            self.writeArrayStore()
+        else:
+            self.advance()  # get '='
+            self.compileExpression()
+            self.popVariable(name)
+        self.advance()  # get ';' symbol
+
+    def compileWhile(self):
+        """
+        Compiles a while statement
+        """
+        top = self.newLabel()
+        end = self.newLabel()
+        self.writer.writeLabel(top)
+        self.advance()  # get 'while' keyword
+        self.advance()  # get '(' symbol
+        self.compileExpression()
+        self.advance()  # get ')' symbol
+        self.writer.writeArithmetic("not")
+        self.writer.writeIf(end)
+        self.advance()  # get '{' symbol
+        self.compileStatements()
+        self.advance()  # get '}' symbol
+        self.writer.writeGoto(top)
+        self.writer.writeLabel(end)
+
+    def compileReturn(self):
+        """
+        Compiles a return statement. Void subroutines return 0.
+        """
+        self.advance()  # get 'return' keyword
+        if self.existExpression():
+            self.compileExpression()
+        else:
+            self.writer.writePush("constant", 0)
+        self.writer.writeReturn()
+        self.advance()  # get ';' symbol
+
+    def compileIf(self):
+        """
+        Compiles an if statement, possibly with a trailing else clause.
+        """
+        end = self.newLabel()
+        otherwise = self.newLabel()
+        self.advance()  # get 'if' keyword
+        self.advance()  # get '(' symbol
+        self.compileExpression()
+        self.advance()  # get ')' symbol
+        self.writer.writeArithmetic("not")
+        self.writer.writeIf(otherwise)
+        self.advance()  # get '{' symbol
+        self.compileStatements()
+        self.advance()  # get '}' symbol
+        self.writer.writeGoto(end)
+        self.writer.writeLabel(otherwise)
+        if self.nextValueIs("else"):
+            self.advance()  # get 'else' keyword
+            self.advance()  # get '{' symbol
+            self.compileStatements()
+            self.advance()  # get '}' symbol
+        self.writer.writeLabel(end)
+
+    def compileExpression(self):
+        """
+        Compiles an expression, applying operators left to right.
+        """
+        self.compileTerm()
+        while self.nextValueIn(self.binaryOp):
+            op = self.advance()  # get op symbol
+            self.compileTerm()
+            self.writeBinaryOp(op)
+
+    def compileTerm(self):
+        """
+        Compiles a term
+        """
+        if self.nextTokenIs("integerConstant"):
+            self.writer.writePush("constant", self.advance())  # get constant
+        elif self.nextTokenIs("stringConstant"):
+            self.writeString(self.advance())  # get constant
+        elif self.nextValueIn(self.keywordConstant):
+            self.writeKeywordConstant(self.advance())  # get constant
+        elif self.nextTokenIs("identifier"):
+            name = self.advance()  # get class/var name
+            if self.nextValueIs("["):  # case of varName[expression]
+                self.writeArrayIndex()
+                self.pushVariable(name)
+                self.writer.writeArithmetic("add")
+                self.writeArrayLoad()
+            elif self.nextValueIs("(") or self.nextValueIs("."):  # case of subroutine call
+                self.writeCall(name)
+            else:
+                self.pushVariable(name)
+        elif self.nextValueIn(self.unaryOp):
+            op = self.advance()  # get unary operation symbol
+            self.compileTerm()
+            self.writer.writeArithmetic(self.unaryCommands[op])
+        elif self.nextValueIs("("):
+            self.advance()  # get '(' symbol
+            self.compileExpression()
+            self.advance()  # get ')' symbol
+
+
+class VMTreeWriter(VMGenerator, JackAST.TreeWalker):
+
+    def __init__(self, output):
+        """
+        Writes vm code for a parse tree built by JackAST.parse, producing the
+        same output as VMCompilationEngine.
+        """
+        self.writer = VMWriter.VMWriter(output)
+        self.initGenerator()
+
+    def write(self, root):
+        """
+        Writes the whole class and closes the file.
+        """
+        self.walk(root)
+        self.writer.close()
+
+    def visitClass(self, node):
+        """
+        Reads the class name, then walks the declarations.
+        """
+        self.className = node.children[1][1]
+        self.visitDefault(node)
+
+    def visitClassVarDec(self, node):
+        """
+        Adds the declared variables to the class symbol table.
+        """
+        children = node.children
+        kind, type = children[0][1], children[1][1]
+        for name in children[2:-1:2]:
+            self.classTable.define(name[1], type, kind)
+
+    def visitSubroutineDec(self, node):
+        """
+        Starts a new subroutine scope and walks its parameters and body.
+        """
+        children = node.children
+        self.subroutineTable.reset()
+        self.subroutineKind = children[0][1]
+        self.subroutineName = children[2][1]
+        if self.subroutineKind == "method":
+            self.subroutineTable.define("this", self.className, "arg")
+        self.walk(children[4])
+        self.walk(children[6])
+
+    def visitParameterList(self, node):
+        """
+        Adds the parameters to the subroutine symbol table.
+        """
+        params = [child for child in node.children if child[1] != ","]
+        for i in range(0, len(params), 2):
+            self.subroutineTable.define(params[i + 1][1], params[i][1], "arg")
+
+    def visitSubroutineBody(self, node):
+        """
+        Walks the local variables, writes the function start, then walks the
+        statements.
+        """
+        children = node.children
+        for child in children[1:-2]:
+            self.walk(child)
+        self.writeSubroutineStart()
+        self.walk(children[-2])
+
+    def visitVarDec(self, node):
+        """
+        Adds the declared variables to the subroutine symbol table.
+        """
+        children = node.children
+        type = children[1][1]
+        for name in children[2:-1:2]:
+            self.subroutineTable.define(name[1], type, "var")
+
+    def visitLetStatement(self, node):
+        """
+        Writes a let statement, storing through that for array targets.
+        """
+        children = node.children
+        name = children[1][1]
+        if children[2][1] == "[":
+            self.walk(children[3])
+            self.pushVariable(name)
+            self.writer.writeArithmetic("add")
+            self.walk(children[6])
+            self.writeArrayStore()
+        else:
+            self.walk(children[3])
+            self.popVariable(name)
+
+    def visitIfStatement(self, node):
+        """
+        Writes an if statement, possibly with a trailing else clause.
+        """
+        children = node.children
+        end = self.newLabel()
+        otherwise = self.newLabel()
+        self.walk(children[2])
+        self.writer.writeArithmetic("not")
+        self.writer.writeIf(otherwise)
+        self.walk(children[5])
+        self.writer.writeGoto(end)
+        self.writer.writeLabel(otherwise)
+        if len(children) > 7:
+            self.walk(children[9])
+        self.writer.writeLabel(end)
+
+    def visitWhileStatement(self, node):
+        """
+        Writes a while statement
+        """
+        children = node.children
+        top = self.newLabel()
+        end = self.newLabel()
+        self.writer.writeLabel(top)
+        self.walk(children[2])
+        self.writer.writeArithmetic("not")
+        self.writer.writeIf(end)
+        self.walk(children[5])
+        self.writer.writeGoto(top)
+        self.writer.writeLabel(end)
+
+    def visitDoStatement(self, node):
+        """
+        Writes a do statement, throwing away the returned value.
+        """
+        self.writeCallTokens(node.children[1:-1])
+        self.writer.writePop("temp", 0)
+
+    def visitReturnStatement(self, node):
+        """
+        Writes a return statement. Void subroutines return 0.
+        """
+        children = node.children
+        if len(children) == 3:
+            self.walk(children[1])
+        else:
+            self.writer.writePush("constant", 0)
+        self.writer.writeReturn()
+
+    def writeCallTokens(self, items):
+        """
+        Writes a subroutine call from its name tokens and expression list:
+        name ( expressionList ) or name . name ( expressionList ).
+        """
+        if items[1][1] == ".":
+            function, nArgs = self.startCall(items[0][1], items[2][1])
+            expressions = items[4]
+        else:
+            function, nArgs = self.startCall(items[0][1], None)
+            expressions = items[2]
+        nArgs += self.walk(expressions)
+        self.writer.writeCall(function, nArgs)
+
+    def visitExpressionList(self, node):
+        """
+        Writes each expression in the list.
+
+        returns: int: the number of expressions
+        """
+        count = 0
+        for child in node.children:
+            if type(child) is JackAST.Node:
+                self.walk(child)
+                count += 1
+        return count
+
+    def visitExpression(self, node):
+        """
+        Writes an expression, applying operators left to right.
+        """
+        children = node.children
+        self.walk(children[0])
+        for i in range(1, len(children), 2):
+            self.walk(children[i + 1])
+            self.writeBinaryOp(children[i][1])
+
+    def visitTerm(self, node):
+        """
+        Writes a term
+        """
+        children = node.children
+        token, value = children[0]
+        if token == "integerConstant":
+            self.writer.writePush("constant", value)
+        elif token == "stringConstant":
+            self.writeString(value)
+        elif token == "keyword":
+            self.writeKeywordConstant(value)
+        elif token == "identifier":
+            if len(children) == 1:
+                self.pushVariable(value)
+            elif children[1][1] == "[":  # case of varName[expression]
+                self.walk(children[2])
+                self.pushVariable(value)
+                self.writer.writeArithmetic("add")
+                self.writeArrayLoad()
+            else:  # case of subroutine call
+                self.writeCallTokens(children)
+        elif value == "(":
+            self.walk(children[1])
+        else:
+            self.walk(children[1])
+            self.writer.writeArithmetic(self.unaryCommands[value])
@@ -0,0 +1,256 @@
+import JackAST
+
+
+def toWord(value):
+    """
+    Wraps an integer to a signed 16 bit Hack word.
+
+    input: value (int)
+    returns: int
+    """
+    return ((value + 32768) & 0xFFFF) - 32768
+
+
+def evaluate(op, left, right):
+    """
+    Applies a binary operator to two constants the way the Hack platform
+    would, or returns None when the result should be left to run time
+    (division by zero).
+
+    input: op (string), left (int), right (int)
+    returns: int or None
+    """
+    if op == '+':
+        return toWord(left + right)
+    if op == '-':
+        return toWord(left - right)
+    if op == '*':
+        return toWord(left * right)
+    if op == '/':
+        if right == 0:
+            return None
+        quotient = abs(left) // abs(right)
+        return toWord(quotient if (left < 0) == (right < 0) else -quotient)
+    if op == '&':
+        return toWord(left & right)
+    if op == '|':
+        return toWord(left | right)
+    if op == '<':
+        return -1 if left < right else 0
+    if op == '>':
+        return -1 if left > right else 0
+    if op == '=':
+        return -1 if left == right else 0
+    return None
+
+
+def constantTerm(value):
+    """
+    Builds a term node for a constant: a bare integer for values from 0 to
+    32767 and a negated one below that. -32768 has no such form, so it gives
+    None.
+
+    input: value (int)
+    returns: JackAST.Node or None
+    """
+    if value >= 0:
+        return JackAST.Node("term", [("integerConstant", str(value))])
+    if value == -32768:
+        return None
+    inner = JackAST.Node("term", [("integerConstant", str(-value))])
+    return JackAST.Node("term", [("symbol", "-"), inner])
+
+
+def constantOf(term):
+    """
+    Returns the value of a term if it is known at compile time, else None.
+
+    input: term (JackAST.Node)
+    returns: int or None
+    """
+    children = term.children
+    token, value = children[0]
+    if len(children) == 1:
+        if token == "integerConstant":
+            return int(value)
+        if token == "keyword":
+            if value == "true":
+                return -1
+            if value in ("false", "null"):
+                return 0
+        return None
+    if token == "symbol" and len(children) == 2:
+        inner = constantOf(children[1])
+        if inner is None:
+            return None
+        return toWord(-inner) if value == "-" else toWord(~inner)
+    return None
+
+
+def isVariable(term):
+    """
+    Checks if a term is a plain variable, which is cheap to read twice.
+    """
+    children = term.children
+    return len(children) == 1 and children[0][0] == "identifier"
+
+
+def hasCall(node):
+    """
+    Checks if a subtree contains a subroutine call, which may have side
+    effects and so cannot be dropped or repeated.
+    """
+    children = node.children
+    if node.rule == "term" and children[0][0] == "identifier" and len(children) > 1 \
+            and children[1][1] in ("(", "."):
+        return True
+    for child in children:
+        if type(child) is JackAST.Node and hasCall(child):
+            return True
+    return False
+
+
+def powerOfTwo(value, limit):
+    """
+    Returns value if it is a power of two from 2 up to limit, else None.
+    """
+    if value is not None and 2 <= value <= limit and value & (value - 1) == 0:
+        return value
+    return None
+
+
+class ConstantFolder(JackAST.TreeWalker):
+
+    MAX_COPIES = 8
+
+    def __init__(self):
+        """
+        Simplifies the expressions of a parse tree in place. Jack applies
+        operators strictly left to right, so an expression is rewritten as a
+        running prefix: the terms and operators kept so far, plus the value
+        of the prefix when it is a known constant.
+
+        Attributes:
+            rewrites (int): Number of simplifications made.
+        """
+        self.rewrites = 0
+
+    def fold(self, root):
+        """
+        Simplifies every expression under root and returns root.
+        """
+        self.walk(root)
+        return root
+
+    def visitTerm(self, node):
+        """
+        Simplifies the expressions inside a term, then folds unary operators
+        on constants and drops parentheses around a single term.
+        """
+        self.visitDefault(node)
+        children = node.children
+        token, value = children[0]
+        if token != "symbol":
+            return
+        if value == "(":
+            inner = children[1].children
+            if len(inner) == 1:
+                node.children = inner[0].children
+                self.rewrites += 1
+        elif children[1].children[0][0] != "integerConstant" or value == "~":
+            constant = constantOf(node)
+            if constant is not None:
+                folded = constantTerm(constant)
+                if folded is not None:
+                    node.children = folded.children
+                    self.rewrites += 1
+
+    def visitExpression(self, node):
+        """
+        Folds constant operations and removes identities such as x+0, x*1
+        and x*0, and turns multiplication of a variable by a small power of
+        two into repeated addition.
+        """
+        self.visitDefault(node)
+        children = node.children
+        kept = [children[0]]
+        known = constantOf(children[0])
+        for i in range(1, len(children), 2):
+            op = children[i][1]
+            term = children[i + 1]
+            constant = constantOf(term)
+            if known is not None and constant is not None:
+                value = evaluate(op, known, constant)
+                folded = constantTerm(value) if value is not None else None
+                if folded is not None:
+                    kept = [folded]
+                    known = value
+                    self.rewrites += 1
+                    continue
+            if self.isRightIdentity(op, constant):
+                self.rewrites += 1
+                continue
+            if self.isLeftIdentity(op, known):
+                kept = [term]
+                known = constant
+                self.rewrites += 1
+                continue
+            if op == '*' and ((constant == 0 and not any(hasCall(t) for t in kept[0::2]))
+                              or (known == 0 and not hasCall(term))):
+                kept = [constantTerm(0)]
+                known = 0
+                self.rewrites += 1
+                continue
+            if op == '*':
+                copies = powerOfTwo(constant, self.MAX_COPIES)
+                if copies is not None and len(kept) == 1 and isVariable(kept[0]):
+                    kept = self.repeatedSum(kept[0], copies)
+                    known = None
+                    self.rewrites += 1
+                    continue
+                copies = powerOfTwo(known, self.MAX_COPIES)
+                if copies is not None and isVariable(term):
+                    kept = self.repeatedSum(term, copies)
+                    known = None
+                    self.rewrites += 1
+                    continue
+            kept.append(children[i])
+            kept.append(term)
+            known = None
+        node.children = kept
+
+    @staticmethod
+    def isRightIdentity(op, constant):
+        """
+        Checks if applying op with constant on the right leaves the left side
+        unchanged: x+0, x-0, x|0, x*1, x/1 and x&-1.
+        """
+        if constant is None:
+            return False
+        return (op in ('+', '-', '|') and constant == 0) \
+            or (op in ('*', '/') and constant == 1) \
+            or (op == '&' and constant == -1)
+
+    @staticmethod
+    def isLeftIdentity(op, constant):
+        """
+        Checks if applying op with constant on the left gives just the right
+        side: 0+x, 0|x, 1*x and -1&x.
+        """
+        if constant is None:
+            return False
+        return (op in ('+', '|') and constant == 0) \
+            or (op == '*' and constant == 1) \
+            or (op == '&' and constant == -1)
+
+    @staticmethod
+    def repeatedSum(term, copies):
+        """
+        Returns the expression children for term + term + ... with copies
+        terms, which Jack's left to right order evaluates as term * copies.
+        """
+        kept = [JackAST.Node("term", list(term.children))]
+        for _ in range(copies - 1):
+            kept.append(("symbol", "+"))
+            kept.append(JackAST.Node("term", list(term.children)))
+        return kept
@@ -1,60 +1,55 @@
 import JackTokenizer
+import XMLWriter
 
 class CompilationEngine:
 
-    binaryOp = {'+', '-', '*', '/', '|', '=', '&lt;', '&gt;', '&amp;'}
+    binaryOp = {'+', '-', '*', '/', '|', '=', '<', '>', '&'}
     unaryOp = {'-', '~'}
     keywordConstant = {'true', 'false', 'null', 'this'}
 
-    def __init__(self, input, output):
+    def __init__(self, input, output, stream=False):
         """
         Creates a new compilation engine with the given input and output files.
+        With stream set, tokens are read from the input on demand instead of 
+        tokenizing the whole file up front.
         """
-        self.tokenizer = JackTokenizer.JackTokenizer(input)
-        self.parsedRules = []
-        self.outputFile = open(output, 'w')
-        self.indent = ""
+        if stream:
+            self.tokenizer = JackTokenizer.StreamingJackTokenizer(input)
+        else:
+            self.tokenizer = JackTokenizer.JackTokenizer(input)
+        self.writer = self.createWriter(output)
 
-    def addIndent(self):
+    def createWriter(self, output):
         """
-        Indents the line
+        Opens the writer for the output file. Subclasses that emit a 
+        different format return their own writer here.
         """
-        self.indent += "    "
-
-    def deleteIndent(self):
-        """
-        Same as shift tab!
-        """
-        self.indent = self.indent[:-4]
+        return XMLWriter.XMLWriter(output)
 
     def writeNonTerminalStart(self, rule):
         """
         Writes opening tag <rule> 
         """
-        self.outputFile.write(self.indent+"<"+rule+">\n")
-        self.parsedRules.append(rule)
-        self.addIndent()
+        self.writer.startNonTerminal(rule)
 
     def writeNonTerminalEnd(self):
         """
         Writes closing tag <rule> 
         """
-        self.deleteIndent()
-        rule = self.parsedRules.pop()
-        self.outputFile.write(self.indent+"</"+rule+">\n")
+        self.writer.endNonTerminal()
 
     def writeTerminal(self, token, value):
         """
         Writes <token> token value <token>
         """
-        self.outputFile.write(self.indent+"<"+token+"> "+value+" </"+token+">\n")
+        self.writer.terminal(token, value)
 
     def advance(self):
         """
         Sets tokenizer to go to the next token to write.
         """
         token, value = self.tokenizer.advance()
-        self.writeTerminal(token, value)
+        self.writer.terminal(token, value)
 
     def nextValueIn(self, lst):
         """
@@ -91,7 +86,7 @@ class CompilationEngine:
             self.compileSubroutine()
         self.advance() #get '}' symbol
         self.writeNonTerminalEnd()
-        self.outputFile.close()
+        self.writer.close()
 
     def existClassVarDec(self):
         """
@@ -22,44 +22,95 @@ class JackTokenizer:
             currtoken (tuple): The current token being processed
             lines (string): The complete source code read from the file.
             tokens (list): list[tuples] where each tuple is token type and its value.
+            position (int): Index of the next token to hand out in tokens.
         """
         self.file = open(file)
         self.currtoken = ""
+        self.position = 0
         self.lines = self.file.read()  # Read code
         self.removeComments()  # Remove comments
         self.tokens = self.tokenize()
-        self.tokens = self.replaceSymbols()
 
     def removeComments(self):
         """ 
         Removes comments from jack file
         """
+        self.lines, _ = self.stripComments(self.lines, True)
+        return
+
+    @staticmethod
+    def stripComments(lines, final):
+        """
+        Removes comments from a piece of jack source. Scans it once, jumping 
+        between the next quote or slash, and joins the kept spans at the end 
+        so the cost is linear in the length of the piece. The positions of 
+        the next quote and slash are kept and only searched for again once 
+        the scan has passed them, so no part of the piece is searched twice.
+
+        When final is False the piece may be cut off in the middle of a 
+        string or comment. Scanning then stops there and the unfinished part 
+        comes back as rest, to be put in front of the next piece. The body of 
+        an unfinished comment is dropped from rest, so it never grows with the 
+        size of the comment.
+
+        input: lines (string), final (bool): whether this is the last piece
+        returns: tuple[string, string]: the text without comments and rest
+        """
+        length = len(lines)
         current = 0
-        filtered = ''
-        end = 0
-        while current< len(self.lines):
-            currentChar = self.lines[current]
-            if currentChar == "\"":
-                end = self.lines.find("\"", current+1)
-                filtered += self.lines[current:end+1]
-                current = end + 1
-            elif currentChar == "/":
-                if self.lines[current + 1] == "/":
-                    end = self.lines.find("\n", current + 1)
-                    current = end + 1
-                    filtered += " "
-                elif self.lines[current + 1] == "*":
-                    end = self.lines.find("*/", current + 1)
-                    current = end + 2
-                    filtered += " "
-                else:
-                    filtered += self.lines[current]
-                    current += 1
+        start = 0
+        spans = []
+        rest = ""
+        quote = lines.find("\"")
+        slash = lines.find("/")
+        while current < length:
+            if quote != -1 and quote < current:
+                quote = lines.find("\"", current)
+            if slash != -1 and slash < current:
+                slash = lines.find("/", current)
+            if quote == -1 and slash == -1:
+                break
+            if slash == -1 or (quote != -1 and quote < slash):
+                end = lines.find("\"", quote + 1)
+                if end == -1 and not final:
+                    spans.append(lines[start:quote])
+                    rest = lines[quote:]
+                    start = length
+                    break
+                current = end + 1 if end != -1 else length
+                continue
+            if slash == length - 1 and not final:
+                spans.append(lines[start:slash])
+                rest = "/"
+                start = length
+                break
+            nextChar = lines[slash + 1:slash + 2]
+            if nextChar == "/":
+                end = lines.find("\n", slash + 1)
+                if end == -1 and not final:
+                    spans.append(lines[start:slash])
+                    rest = "//"
+                    start = length
+                    break
+                spans.append(lines[start:slash])
+                spans.append(" ")
+                current = end if end != -1 else length  # keep the newline so lines still count
+                start = current
+            elif nextChar == "*":
+                end = lines.find("*/", slash + 1)
+                if end == -1 and not final:
+                    spans.append(lines[start:slash])
+                    rest = lines[slash:] if length - slash <= 3 else "/* " + lines[-1]
+                    start = length
+                    break
+                spans.append(lines[start:slash])
+                spans.append(" " + "\n" * lines.count("\n", slash, end))
+                current = end + 2 if end != -1 else length
+                start = current
             else:
-                filtered += self.lines[current]
-                current += 1
-        self.lines = filtered
-        return
+                current = slash + 1
+        spans.append(lines[start:])
+        return ''.join(spans), rest
 
     def tokenize(self):
         """
@@ -67,11 +118,31 @@ class JackTokenizer:
 
         Each token is represented as a tuple where the first element is the 
         token type (like keyword or symbol). The second element is the token 
-        value (like class or "{").
+        value (like class or "{"). The type comes straight from the name of 
+        the group in the master regex that matched, so the source is only 
+        scanned once.
 
         returns: list[tuple]: tuples in the form (token type, token value).
         """
-        return [self.token(word) for word in self.split(self.lines)]
+        return [self.classify(match) for match in self.word.finditer(self.lines)]
+
+    def tokenLines(self):
+        """
+        Returns the source line of each token, for source maps. Comments were
+        replaced keeping their newlines, so counting newlines in the cleaned
+        source gives the line in the original file.
+
+        returns: list[int]: 1-based line number of each token in tokens
+        """
+        text = self.lines
+        numbers = []
+        line = 1
+        last = 0
+        for match in self.word.finditer(text):
+            line += text.count("\n", last, match.start())
+            last = match.start()
+            numbers.append(line)
+        return numbers
 
     def token(self, word):
         """
@@ -80,25 +151,32 @@ class JackTokenizer:
         input: word (string)
         returns: tuple[string, string]
         """
-        if re.match(self.keywordsRegex, word) is not None: 
-            return ("keyword", word)
-        elif re.match(self.symbolsRegex, word) is not None: 
-            return ("symbol", word)
-        elif re.match(self.integerRegex, word) is not None:  
-            return ("integerConstant", word)
-        elif re.match(self.stringsRegex, word) is not None:  
-            return ("stringConstant", word[1:-1])
-        else:                                            
-            return ("identifier", word)
+        return self.classify(self.word.match(word))
+
+    @staticmethod
+    def classify(match):
+        """
+        Builds the token tuple for a match of the master regex, stripping the 
+        quotes off string constants.
 
+        input: match (re.Match)
+        returns: tuple[string, string]
+        """
+        kind = match.lastgroup
+        if kind == "stringConstant":
+            return (kind, match.group()[1:-1])
+        return (kind, match.group())
 
-    keywordsRegex = '(?!\w)|'.join(KeywordsCodes) + '(?!\w)'
-    symbolsRegex = '[' + re.escape('|'.join(SymbolsCodes)) + ']'
+    keywordsRegex = r'(?!\w)|'.join(sorted(KeywordsCodes)) + r'(?!\w)'
+    symbolsRegex = '[' + re.escape('|'.join(sorted(SymbolsCodes))) + ']'
     integerRegex = r'\d+'
     stringsRegex = r'"[^"\n]*"'
     identifiersRegex = r'[\w]+'
-    word = re.compile(keywordsRegex + '|' + symbolsRegex + '|' + integerRegex \
-                      + '|' + stringsRegex + '|' + identifiersRegex)
+    word = re.compile('(?P<keyword>' + keywordsRegex + ')'
+                      + '|(?P<symbol>' + symbolsRegex + ')'
+                      + '|(?P<integerConstant>' + integerRegex + ')'
+                      + '|(?P<stringConstant>' + stringsRegex + ')'
+                      + '|(?P<identifier>' + identifiersRegex + ')')
 
     def split(self, line):
         """
@@ -108,39 +186,7 @@ class JackTokenizer:
         input: line (string)
         returns: list[string]
         """
-        return self.word.findall(line)
-
-    def replaceSymbols(self):
-        """
-        Replaces symbols with their xml code for each tuple token 
-            - `<` becomes `&lt;`
-            - `>` becomes `&gt;`
-            - `"` becomes `&quot;`
-            - `&` becomes `&amp;`
-
-        returns: list[tuple]: A list of tokens with symbols replaced.
-        """
-        return [self.replace(pair) for pair in self.tokens]
-
-    def replace(self, pair):
-        """
-        Creates tuple token for symbols 
-
-        input: pair (tuple): A token tuple of the form (token type, token value).
-
-        returns: tuple the token tuple with non xml symbols replaced, if necessary.
-        """
-        token, value = pair
-        if   value == '<': 
-            return (token, '&lt;')
-        elif value == '>': 
-            return (token, '&gt;')
-        elif value == '"': 
-            return (token, '&quot;')
-        elif value == '&': 
-            return (token, '&amp;')
-        else:              
-            return (token, value)
+        return [match.group() for match in self.word.finditer(line)]
 
     def hasMoreTokens(self):
         """
@@ -148,29 +194,30 @@ class JackTokenizer:
 
         returns: bool
         """
-        return self.tokens != []
+        return self.position < len(self.tokens)
 
     def advance(self):
         """
-        Advances to the next token in the list of tokens and pops off the 
-        token after advancing.
+        Advances to the next token in the list of tokens.
 
-        Removes the next token from the list and sets it as the current token.
+        Moves the cursor past the next token and sets it as the current token.
+        The list itself is never shifted, so each call is O(1).
 
         returns: tuple
         """
-        self.currtoken = self.tokens.pop(0)
+        self.currtoken = self.tokens[self.position]
+        self.position += 1
         return self.currtoken
 
     def peek(self):
         """
-        Returns the next token without removing it from the list or 
-        ("ERROR", 0) if no tokens are left.
+        Returns the next token without moving the cursor or ("ERROR", 0) if 
+        no tokens are left.
 
         returns: tuple
         """
-        if self.hasMoreTokens():
-            return self.tokens[0]
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
         else:
             return ("ERROR", 0)
 
@@ -184,4 +231,87 @@ class JackTokenizer:
         """
         Returns the current value
         """
-        return self.currtoken[1]
\ No newline at end of file
+        return self.currtoken[1]
+
+class StreamingJackTokenizer(JackTokenizer):
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, file, chunkSize=CHUNK_SIZE):
+        """
+        Initializes a tokenizer that reads the file in chunks and produces 
+        tokens on demand, so memory is bounded by the chunk size and the one 
+        token of lookahead the parser needs rather than by the file size.
+
+        Args:
+            file (string): Path to the Jack source file.
+            chunkSize (int): Number of characters to read at a time.
+
+        Attributes:
+            file (file object): Jack file, closed once the last token is read
+            currtoken (tuple): The current token being processed
+            chunkSize (int): Number of characters to read at a time.
+            tokens (generator): Yields the remaining tokens in order.
+            nextToken (tuple): The token after currtoken, or None at the end.
+        """
+        self.file = open(file)
+        self.currtoken = ""
+        self.chunkSize = chunkSize
+        self.tokens = self.streamTokens()
+        self.nextToken = next(self.tokens, None)
+
+    def streamTokens(self):
+        """
+        Reads the file a chunk at a time, strips comments and yields token 
+        tuples. A token that touches the end of what has been read so far is 
+        held back until the next chunk, since the chunk may have cut it in two.
+
+        returns: generator[tuple]
+        """
+        rest = ""
+        pending = ""
+        while True:
+            chunk = self.file.read(self.chunkSize)
+            final = chunk == ""
+            text, rest = self.stripComments(rest + chunk, final)
+            pending += text
+            position = 0
+            for match in self.word.finditer(pending):
+                if match.end() == len(pending) and not final:
+                    break
+                yield self.classify(match)
+                position = match.end()
+            pending = pending[position:]
+            if final:
+                break
+        self.file.close()
+
+    def hasMoreTokens(self):
+        """
+        Checks if there are more tokens to process
+
+        returns: bool
+        """
+        return self.nextToken is not None
+
+    def advance(self):
+        """
+        Advances to the next token and pulls the one after it from the stream.
+
+        returns: tuple
+        """
+        self.currtoken = self.nextToken
+        self.nextToken = next(self.tokens, None)
+        return self.currtoken
+
+    def peek(self):
+        """
+        Returns the next token without advancing or ("ERROR", 0) if no tokens 
+        are left.
+
+        returns: tuple
+        """
+        if self.nextToken is not None:
+            return self.nextToken
+        else:
+            return ("ERROR", 0)
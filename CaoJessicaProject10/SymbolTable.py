@@ -0,0 +1,73 @@
+class SymbolTable:
+
+    SEGMENTS = {"static": "static", "field": "this", "arg": "argument", "var": "local"}
+
+    def __init__(self):
+        """
+        Initializes an empty symbol table for one scope. The compilation
+        engine keeps one for the class (static and field) and one for the
+        current subroutine (arg and var).
+
+        Attributes:
+            symbols (dict): name -> (type, kind, index)
+            counts (dict): kind -> number of variables of that kind
+        """
+        self.symbols = {}
+        self.counts = {kind: 0 for kind in self.SEGMENTS}
+
+    def reset(self):
+        """
+        Empties the table, used when a new subroutine starts.
+        """
+        self.symbols.clear()
+        for kind in self.counts:
+            self.counts[kind] = 0
+
+    def define(self, name, type, kind):
+        """
+        Defines a new variable and gives it the next index of its kind.
+
+        input: name (string), type (string), kind (string): static, field,
+               arg or var
+        returns: None
+        """
+        self.symbols[name] = (type, kind, self.counts[kind])
+        self.counts[kind] += 1
+
+    def varCount(self, kind):
+        """
+        Returns the number of variables of the given kind.
+
+        input: kind (string)
+        returns: int
+        """
+        return self.counts[kind]
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def kindOf(self, name):
+        """
+        Returns the kind of the named variable, or None if it is not defined
+        in this scope.
+        """
+        entry = self.symbols.get(name)
+        return entry[1] if entry is not None else None
+
+    def typeOf(self, name):
+        """
+        Returns the type of the named variable.
+        """
+        return self.symbols[name][0]
+
+    def indexOf(self, name):
+        """
+        Returns the index of the named variable within its kind.
+        """
+        return self.symbols[name][2]
+
+    def segmentOf(self, name):
+        """
+        Returns the vm memory segment that holds the named variable.
+        """
+        return self.SEGMENTS[self.symbols[name][1]]
@@ -0,0 +1,137 @@
+import os
+import sys
+
+
+class VMWriter:
+
+    FLUSH_EVERY = 4096
+
+    def __init__(self, output, indentUnit="    "):
+        """
+        Initializes a buffered writer for vm commands, laid out like the .vm
+        files in CaoJessicaProject9: function and label lines flush left,
+        everything else indented.
+
+        Args:
+            output (string): Path to the .vm file to write.
+            indentUnit (string): Indent put in front of ordinary commands.
+
+        Attributes:
+            outputFile (file object): vm file
+            lines (list): Lines written since the last flush.
+            sourceLines (list): Jack line of every vm line written, when
+                recording a source map, else None.
+        """
+        self.output = output
+        self.outputFile = open(output, 'w')
+        self.indent = indentUnit
+        self.lines = []
+        self.sourceLines = None
+
+    def recordSourceMap(self, source, currentLine):
+        """
+        Starts recording which Jack line each vm line comes from. The map is
+        written next to the output as output + ".map" when the writer closes.
+
+        Args:
+            source (string): Path of the .jack file being compiled.
+            currentLine (function): Returns the Jack line being compiled.
+        """
+        self.source = source
+        self.currentLine = currentLine
+        self.sourceLines = []
+
+    def write(self, line):
+        """
+        Adds a line to the buffer and flushes it once it is large enough.
+        """
+        lines = self.lines
+        lines.append(line)
+        if self.sourceLines is not None:
+            self.sourceLines.append(self.currentLine())
+        if len(lines) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def writePush(self, segment, index):
+        """
+        Writes push segment index
+        """
+        self.write(f"{self.indent}push {segment} {index}\n")
+
+    def writePop(self, segment, index):
+        """
+        Writes pop segment index
+        """
+        self.write(f"{self.indent}pop {segment} {index}\n")
+
+    def writeArithmetic(self, command):
+        """
+        Writes an arithmetic or logical command such as add, neg or not.
+        """
+        self.write(f"{self.indent}{command}\n")
+
+    def writeLabel(self, label):
+        """
+        Writes label label
+        """
+        self.write(f"label {label}\n")
+
+    def writeGoto(self, label):
+        """
+        Writes goto label
+        """
+        self.write(f"{self.indent}goto {label}\n")
+
+    def writeIf(self, label):
+        """
+        Writes if-goto label
+        """
+        self.write(f"{self.indent}if-goto {label}\n")
+
+    def writeCall(self, name, nArgs):
+        """
+        Writes call name nArgs
+        """
+        self.write(f"{self.indent}call {name} {nArgs}\n")
+
+    def writeFunction(self, name, nLocals):
+        """
+        Writes function name nLocals
+        """
+        self.write(f"function {name} {nLocals}\n")
+
+    def writeReturn(self):
+        """
+        Writes return
+        """
+        self.write(f"{self.indent}return\n")
+
+    def flush(self):
+        """
+        Writes the buffered lines to the file in one block.
+        """
+        self.outputFile.write(''.join(self.lines))
+        self.lines = []
+
+    def close(self):
+        """
+        Flushes what is left in the buffer and closes the file.
+        """
+        self.flush()
+        self.outputFile.close()
+        if self.sourceLines is not None:
+            self.writeSourceMap()
+
+    def writeSourceMap(self):
+        """
+        Writes the source map sidecar with CaoJessicaProject6's SourceMap,
+        tracing each vm line to the Jack line it comes from. VMp2.py and the
+        assembler compose it into their own maps.
+        """
+        # Imported here so compiling without --source-map needs no Project 6
+        project6 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "CaoJessicaProject6")
+        if project6 not in sys.path:
+            sys.path.append(project6)
+        from SourceMap import SourceMap
+        positions = [(0, line) for line in self.sourceLines]
+        SourceMap.build(self.output, [self.source], positions).save()
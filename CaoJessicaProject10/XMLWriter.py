@@ -0,0 +1,86 @@
+class XMLWriter:
+
+    ESCAPES = {'<': '&lt;', '>': '&gt;', '"': '&quot;', '&': '&amp;'}
+    ESCAPE_TABLE = str.maketrans(ESCAPES)
+    FLUSH_EVERY = 4096
+
+    def __init__(self, output, indentUnit="    "):
+        """
+        Initializes a buffered writer for the xml parse tree.
+
+        Args:
+            output (string): Path to the xml file to write.
+            indentUnit (string): Indentation added per nesting level.
+
+        Attributes:
+            outputFile (file object): xml file
+            fragments (list): Strings written since the last flush.
+            indents (list): indents[depth] is the indent string for depth.
+            indent (string): Indent string for the current depth.
+            rules (list): Stack of the open non terminal rules.
+        """
+        self.outputFile = open(output, 'w')
+        self.fragments = []
+        self.indentUnit = indentUnit
+        self.indents = [""]
+        self.indent = ""
+        self.rules = []
+
+    def setDepth(self, depth):
+        """
+        Points indent at the indent string for depth, extending the table of
+        precomputed indents the first time a depth is reached.
+        """
+        if depth == len(self.indents):
+            self.indents.append(self.indents[-1] + self.indentUnit)
+        self.indent = self.indents[depth]
+
+    def write(self, fragment):
+        """
+        Adds a fragment to the buffer and flushes it once it is large enough.
+        """
+        fragments = self.fragments
+        fragments.append(fragment)
+        if len(fragments) >= self.FLUSH_EVERY:
+            self.flush()
+
+    def startNonTerminal(self, rule):
+        """
+        Writes opening tag <rule> and indents the lines after it.
+        """
+        self.write(self.indent + "<" + rule + ">\n")
+        self.rules.append(rule)
+        self.setDepth(len(self.rules))
+
+    def endNonTerminal(self):
+        """
+        Writes closing tag </rule> for the innermost open rule.
+        """
+        rule = self.rules.pop()
+        self.setDepth(len(self.rules))
+        self.write(self.indent + "</" + rule + ">\n")
+
+    def terminal(self, token, value):
+        """
+        Writes <token> value </token>, escaping the xml special characters in
+        value.
+        """
+        if token == "symbol":
+            value = self.ESCAPES.get(value, value)
+        elif token == "stringConstant":
+            value = value.translate(self.ESCAPE_TABLE)
+        self.write(self.indent + "<" + token + "> " + value + " </" + token + ">\n")
+
+    def flush(self):
+        """
+        Writes the buffered fragments to the file in one block.
+        """
+        self.outputFile.write(''.join(self.fragments))
+        self.fragments = []
+
+    def close(self):
+        """
+        Flushes what is left in the buffer and closes the file.
+        """
+        self.flush()
+        self.outputFile.close()
@@ -1,6 +1,20 @@
+import argparse
+import mmap
+import os
 import re
 import sys
-next_variable_address = 16
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from SourceMap import SourceMap
+
+# Output formats: the .hack text of '0'/'1' lines, raw 16-bit words in either byte order, or a NumPy .npy array of
+# little-endian uint16 that np.load (or np.load(mmap_mode='r')) reads without parsing
+OUTPUT_EXTENSIONS = {'hack': '.hack', 'le': '.bin', 'be': '.bin', 'npy': '.npy'}
+CHUNK_WORDS = 1 << 15
+# Line and block comments, matched on the raw bytes of a memory mapped .asm file
+COMMENT_BYTES = re.compile(rb'//[^\n]*|/\*.*?\*/', re.DOTALL)
+# Smallest slice of a program handed to one worker by the parallel second pass
+PARALLEL_CHUNK = 1 << 16
 
 # Define the Hack Computer instruction sets
 COMP_TABLE = { '0': '0101010', '1': '0111111', '-1': '0111010', 'D': '0001100', 'A': '0110000',
@@ -15,26 +29,65 @@ DEST_TABLE = { '': '000', 'M': '001', 'D': '010', 'MD': '011', 'A': '100', 'AM':
 JUMP_TABLE = { '': '000', 'JGT': '001', 'JEQ': '010', 'JGE': '011', 'JLT': '100', 'JNE': '101', 'JLE': '110', 
 'JMP': '111'}
 
-# Initialize symbol table with predefined symbols
+# Predefined symbols. Each Assembler starts from a copy of this table, so it is never modified
 SYMBOL_TABLE = { 'SP': 0, 'LCL': 1, 'ARG': 2, 'THIS': 3, 'THAT': 4, 'SCREEN': 16384, 'KBD': 24576,
     **{f'R{i}': i for i in range(16)}}
+FIRST_VARIABLE_ADDRESS = 16
+
+# Every C-instruction the tables allow, as written in assembly ("dest=comp;jump" with the empty parts left out),
+# mapped straight to its 16-bit word so encoding one is a single dictionary lookup
+C_INSTRUCTIONS = {
+    (f'{dest}=' if dest else '') + comp + (f';{jump}' if jump else ''): int(f'111{c}{d}{j}', 2)
+    for dest, d in DEST_TABLE.items() for comp, c in COMP_TABLE.items() for jump, j in JUMP_TABLE.items()
+}
 
-def parse_assembly(filename):
+def parse_assembly(filename, mapped=False):
     """
     Cleans the file to ignore comments and whitespace. Taken same logic  from Project 0, but does not write a new file. 
     Comments can begin with // or with /* and end with */. Unlike project0, this will not write a new file, it instead
-    returns a list where each value is the cleaned line. 
+    returns a list where each value is the cleaned line. With mapped, the file is read through map_assembly instead.
 
-    Input: filename: string 
+    Input: filename: string, mapped: bool
     output: list[string]
     """
+    if mapped:
+        return map_assembly(filename)
     with open(filename, 'r') as f:
         lines = f.readlines()
 
-    instructions = []
+    return list(clean_lines(lines))
+
+def map_assembly(filename):
+    """
+    Memory maps the file and removes the comments from its bytes with one regular expression pass, then decodes what
+    is left (instructions, labels and the whitespace between them) in one go and splits it on whitespace. Comments
+    are never decoded and no str is made per line, but the stripped text is copied once as bytes and once as a str:
+    the peak is those two copies while decoding, then the str plus the token list while splitting. Decoding token by
+    token instead would avoid the whole-file str, but it is about 3x slower and its peak is no lower, since a list of
+    bytes tokens is built before the str tokens. Hack instructions never contain spaces, so the pieces are exactly
+    the cleaned lines parse_assembly returns.
+
+    input: filename: string
+    output: list[string]
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:  # mmap cannot map an empty file
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            return COMMENT_BYTES.sub(b'', source).decode('utf-8').split()
+
+def clean_lines(lines, numbered=False):
+    """
+    Generator behind parse_assembly. Takes any iterable of raw lines (a list or an open file) and yields the cleaned
+    lines one at a time, so a file can be cleaned without holding all of it in memory. With numbered it yields
+    (1-based line number, cleaned line) pairs instead.
+
+    input: lines: iterable[string], numbered: bool
+    output: generator[string or tuple[int, string]]
+    """
     insidecomment = False
 
-    for line in lines:
+    for number, line in enumerate(lines, 1):
         line = line.strip()
 
         if not line:
@@ -54,101 +107,440 @@ def parse_assembly(filename):
             line = line.split('//')[0].strip()
 
         if line and not insidecomment:  # Ignore empty lines
-            instructions.append(line)
+            yield (number, line) if numbered else line
 
-    return instructions
+def instruction_lines(filename, mapped=False):
+    """
+    Returns the line of the .asm file each instruction comes from, indexed by ROM address (labels take no address).
+    With mapped, comments are removed the way map_assembly removes them, so the lines match the instructions that
+    --mmap assembled (a block comment can end on the line it starts on there, unlike in clean_lines).
 
-def first_pass(instructions):
+    input: filename: string, mapped: bool
+    output: list[int]
     """
-    Initial read through of the cleaned file and will add labels to our dictionary of symbols with value of the line
-    number in the file (address) of the label. It will return a new list without the labels. 
+    if mapped:
+        return mapped_instruction_lines(filename)
+    with open(filename, 'r') as f:
+        return [number for number, line in clean_lines(f, numbered=True) if not line.startswith('(')]
 
-    input: instructions: list[strings] 
-    output: list[strings]
+def mapped_instruction_lines(filename):
     """
-    line_number = 0
-    for instruction in instructions:
-        if instruction.startswith('(') and instruction.endswith(')'):
-            label = instruction[1:-1]
-            SYMBOL_TABLE[label] = line_number  # Map label to current line number
-        else:
-            line_number += 1 
-    return [instr for instr in instructions if not (instr.startswith('(') and instr.endswith(')'))]
+    instruction_lines for map_assembly: strips the comments from the mapped bytes with COMMENT_BYTES, keeping the
+    newlines inside block comments so line numbers still count, and numbers every whitespace separated piece.
 
-def translate_a_instruction(instruction):
+    input: filename: string
+    output: list[int]
     """
-    Function to translate a instructions. Type a instructions will be of form "@value" where value is a number. 
-    This function will convert this line into 15 bit binary number with a leading 0.
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+            text = COMMENT_BYTES.sub(lambda comment: b'\n' * comment.group().count(b'\n'), source)
+    return [number for number, line in enumerate(text.split(b'\n'), 1)
+            for piece in line.split() if not piece.startswith(b'(')]
 
-    input: instruction: string 
-    output: string -> binary command in machine language
+def write_source_map(filename, output_filename, mapped=False):
     """
-    global next_variable_address
-    address = instruction[1:]
-    if address.isdigit():
-        address = int(address)
-    else:
-        # Allocate new address if symbol is not already in the symbol table
-        if address not in SYMBOL_TABLE:
-            SYMBOL_TABLE[address] = next_variable_address
-            next_variable_address += 1
-        address = SYMBOL_TABLE[address]
-    return f'0{address:015b}'  # A-instruction is 0 followed by 15-bit address
+    Writes output_filename.map, tracing each ROM address to its .asm line. If the .asm file has a map of its own
+    (VMp2.py --source-map), it is composed in, so addresses also lead to the .vm and .jack lines. mapped must match
+    how the file was assembled, so addresses are counted from the same instructions.
+
+    input: filename: string, output_filename: string, mapped: bool
+    output: string -> name of the .map file
+    """
+    positions = [(0, line) for line in instruction_lines(filename, mapped)]
+    return SourceMap.build(output_filename, [filename], positions).save()
 
 def translate_c_instruction(instruction):
     """
-    Function to translate c instructions. Type c instructions will be of form "dest=comp;jump". We will use the symbol 
-    table dictionary to convert. 
+    Function to translate c instructions. Type c instructions will be of form "dest=comp;jump". The word comes from
+    the precomputed C_INSTRUCTIONS table. 
 
     input: instruction: string
     output: string -> binary command in machine language
     """
-    if '=' in instruction:
-        dest, rest = instruction.split('=')
-    else:
-        dest, rest = '', instruction
+    return f'{C_INSTRUCTIONS[instruction]:016b}'
 
-    if ';' in rest:
-        comp, jump = rest.split(';')
-    else:
-        comp, jump = rest, ''
+def hack_text(words):
+    """
+    Formats instruction words as .hack text, one 16 character binary line per word. Only done at output time; the
+    assembler itself works on integers.
+
+    input: words: iterable[int]
+    output: string
+    """
+    return ''.join([f'{word:016b}\n' for word in words])
+
+def npy_header(count):
+    """
+    Builds the header of a version 1.0 .npy file holding count little-endian uint16 values, padded so the data
+    starts on a 64 byte boundary as the format asks.
+
+    input: count: int
+    output: bytes
+    """
+    header = "{'descr': '<u2', 'fortran_order': False, 'shape': (%d,), }" % count
+    padding = 64 - (10 + len(header) + 1) % 64
+    header = header + ' ' * padding + '\n'
+    return b'\x93NUMPY\x01\x00' + len(header).to_bytes(2, 'little') + header.encode('latin1')
+
+def write_words(f, words, fmt):
+    """
+    Writes an array('H') of instruction words to a binary file in the byte order of fmt ('be' is big-endian,
+    'le' and 'npy' are little-endian).
+
+    input: f: file opened in binary mode, words: array('H'), fmt: string
+    output: None
+    """
+    f.write(packed_words(words, fmt))
+
+def packed_words(words, fmt):
+    """
+    Returns an array('H') of instruction words as bytes in the byte order of fmt.
 
-    return f'111{COMP_TABLE[comp]}{DEST_TABLE[dest]}{JUMP_TABLE[jump]}'
+    input: words: array('H'), fmt: string
+    output: bytes
+    """
+    byteorder = 'big' if fmt == 'be' else 'little'
+    if byteorder != sys.byteorder:
+        words = array('H', words)
+        words.byteswap()
+    return words.tobytes()
+
+# Assembler of a parallel second pass worker, set up once per process by start_encoder
+encoder = None
 
-def assemble_to_hack(instructions, output_filename):
+def start_encoder(symbol_table):
     """
-    Second pass of the instructions after cleaning and parsing to convert each line into its binary instruction in 
-    machine language. Writes each line to a file with name output_filename. 
+    Initializer for the worker processes of the parallel second pass. Gives the worker an Assembler with the finished
+    symbol table of the program, so it never has to allocate a variable itself.
 
-    input: instructions: list[strings], output_filename: string
+    input: symbol_table: dict
     output: None
     """
-    # Second pass: Translate instructions to binary
-    binary_instructions = []
-    for instruction in instructions:
-        if instruction.startswith('@'):
-            binary_instructions.append(translate_a_instruction(instruction))
+    global encoder
+    encoder = Assembler()
+    encoder.symbol_table = symbol_table
+
+def encode_chunk(chunk, fmt):
+    """
+    Encodes a slice of a program, given as its instructions joined by newlines, in a worker process and returns it
+    ready to write: .hack text, or packed words for the binary formats.
+
+    input: chunk: string, fmt: string
+    output: string or bytes
+    """
+    words = array('H', map(encoder.encode, chunk.split('\n')))
+    if fmt == 'hack':
+        return hack_text(words)
+    return packed_words(words, fmt)
+
+class Assembler:
+    """
+    Assembles Hack programs. Each instance has its own symbol table and next free variable address, so several
+    programs can be assembled in one process (or from several threads, one Assembler each). Use a new Assembler for
+    every program.
+    """
+
+    def __init__(self):
+        self.symbol_table = dict(SYMBOL_TABLE)
+        self.next_variable_address = FIRST_VARIABLE_ADDRESS
+        # Instruction text -> word, starting with every C-instruction and remembering A-instructions once resolved
+        self.words = dict(C_INSTRUCTIONS)
+
+    def first_pass(self, instructions):
+        """
+        Initial read through of the cleaned file and will add labels to our dictionary of symbols with value of the line
+        number in the file (address) of the label. It will return a new list without the labels. 
+
+        input: instructions: list[strings] 
+        output: list[strings]
+        """
+        line_number = 0
+        for instruction in instructions:
+            if instruction.startswith('(') and instruction.endswith(')'):
+                label = instruction[1:-1]
+                self.symbol_table[label] = line_number  # Map label to current line number
+            else:
+                line_number += 1 
+        return [instr for instr in instructions if not (instr.startswith('(') and instr.endswith(')'))]
+
+    def translate_a_instruction(self, instruction):
+        """
+        Function to translate a instructions. Type a instructions will be of form "@value" where value is a number. 
+        This function will convert this line into 15 bit binary number with a leading 0.
+
+        input: instruction: string 
+        output: string -> binary command in machine language
+        """
+        return f'0{self.a_address(instruction):015b}'  # A-instruction is 0 followed by 15-bit address
+
+    def encode(self, instruction):
+        """
+        Returns the 16-bit word for an instruction. C-instructions and A-instructions seen before are a single lookup
+        in self.words; a new A-instruction is resolved once (allocating its variable if needed) and remembered. Labels
+        are fixed by the first pass and variables never move, so the remembered words stay valid.
+
+        input: instruction: string
+        output: int
+        """
+        word = self.words.get(instruction)
+        if word is None:
+            if not instruction.startswith('@'):
+                raise KeyError(instruction)
+            word = self.a_address(instruction)
+            self.words[instruction] = word
+        return word
+
+    def a_address(self, instruction):
+        """
+        Resolves the value of an A-instruction: the number itself, or the address of the label or variable, giving
+        new variables the next free address.
+
+        input: instruction: string
+        output: int
+        """
+        address = instruction[1:]
+        if address.isdigit():
+            address = int(address)
         else:
-            binary_instructions.append(translate_c_instruction(instruction))
+            # Allocate new address if symbol is not already in the symbol table
+            if address not in self.symbol_table:
+                self.symbol_table[address] = self.next_variable_address
+                self.next_variable_address += 1
+            address = self.symbol_table[address]
+        return address
+
+    def assemble_to_hack(self, instructions, output_filename, fmt='hack'):
+        """
+        Second pass of the instructions after cleaning and parsing to convert each line into its binary instruction in 
+        machine language. Writes each line to a file with name output_filename. For the other formats in
+        OUTPUT_EXTENSIONS the instructions are written as packed 16-bit words instead.
+
+        input: instructions: list[strings], output_filename: string, fmt: string
+        output: None
+        """
+        # Second pass: Translate instructions to binary
+        encode = self.encode
+        words = array('H', [encode(instruction) for instruction in instructions])
+
+        if fmt != 'hack':
+            with open(output_filename, 'wb') as f:
+                if fmt == 'npy':
+                    f.write(npy_header(len(words)))
+                write_words(f, words, fmt)
+            return
+
+        # Write to .hack file
+        with open(output_filename, 'w') as f:
+            f.write(hack_text(words))
+
+    def allocate_variables(self, instructions):
+        """
+        Gives every variable of the program its address, in order of first use, without encoding anything. This is
+        the only order dependent part of the second pass, so once it is done the instructions can be encoded in any
+        order.
+
+        input: instructions: list[strings]
+        output: None
+        """
+        symbol_table = self.symbol_table
+        for instruction in dict.fromkeys(instructions):  # Distinct instructions in order of first use
+            if instruction.startswith('@'):
+                address = instruction[1:]
+                if address not in symbol_table and not address.isdigit():
+                    symbol_table[address] = self.next_variable_address
+                    self.next_variable_address += 1
+
+    def assemble_to_hack_parallel(self, instructions, output_filename, fmt='hack', workers=2):
+        """
+        Same as assemble_to_hack, but splits the second pass across worker processes. Variables are allocated first in
+        a serial scan, then chunks of at least PARALLEL_CHUNK instructions are encoded and formatted by the workers and
+        written in order, so the output is the same as the serial one.
+
+        input: instructions: list[strings], output_filename: string, fmt: string, workers: int
+        output: None
+        """
+        self.allocate_variables(instructions)
+        size = max(PARALLEL_CHUNK, -(-len(instructions) // (workers * 4)))
+        # Each chunk goes to its worker as one newline joined string, which pickles far faster than a list
+        chunks = ['\n'.join(instructions[i:i + size]) for i in range(0, len(instructions), size)]
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=start_encoder, initargs=(self.symbol_table,))
+        with pool, open(output_filename, 'w' if fmt == 'hack' else 'wb') as f:
+            if fmt == 'npy':
+                f.write(npy_header(len(instructions)))
+            for data in pool.map(encode_chunk, chunks, [fmt] * len(chunks)):
+                f.write(data)
+
+    def scan_labels(self, filename):
+        """
+        Streaming first pass. Reads the file line by line and adds each label to the symbol table, keeping nothing but
+        the label table and a count of the instructions.
+
+        input: filename: string
+        output: int -> number of instructions (labels excluded)
+        """
+        line_number = 0
+        with open(filename, 'r') as f:
+            for instruction in clean_lines(f):
+                if instruction.startswith('(') and instruction.endswith(')'):
+                    self.symbol_table[instruction[1:-1]] = line_number
+                else:
+                    line_number += 1
+        return line_number
+
+    def stream_to_hack(self, filename, output_filename, fmt='hack', count=0):
+        """
+        Streaming second pass. Reads the file again line by line and writes each translated instruction straight to a
+        buffered output file, so memory use does not depend on the size of the program. Words are written in chunks of
+        CHUNK_WORDS; the .npy header needs the instruction count from scan_labels.
+
+        input: filename: string, output_filename: string, fmt: string, count: int
+        output: None
+        """
+        encode = self.encode
+        with open(filename, 'r') as src, open(output_filename, 'w' if fmt == 'hack' else 'wb') as f:
+            if fmt == 'npy':
+                f.write(npy_header(count))
+            words = array('H')
+            for instruction in clean_lines(src):
+                if not (instruction.startswith('(') and instruction.endswith(')')):
+                    words.append(encode(instruction))
+                if len(words) == CHUNK_WORDS:
+                    self.write_chunk(f, words, fmt)
+                    words = array('H')
+            self.write_chunk(f, words, fmt)
+
+    @staticmethod
+    def write_chunk(f, words, fmt):
+        """
+        Writes a chunk of words from the streaming pass in the requested format.
+
+        input: f: output file, words: array('H'), fmt: string
+        output: None
+        """
+        if fmt == 'hack':
+            f.write(hack_text(words))
+        else:
+            write_words(f, words, fmt)
+
+    def assemble(self, filename, fmt='hack', workers=1, mapped=False):
+        """
+        Assembles a file from asm to machine language. Writes the result to a .hack file, or to a .bin/.npy file for
+        the binary formats. With workers above 1, programs longer than one PARALLEL_CHUNK get a parallel second pass.
+        With mapped, the file is memory mapped and cleaned as bytes (see map_assembly).
+
+        input: filename: string, fmt: string, workers: int, mapped: bool
+        output: string -> name of the output file
+        """
+        instructions = parse_assembly(filename, mapped)
+        instructions = self.first_pass(instructions)  # Resolve labels in the first pass
+        output_filename = filename.replace('.asm', OUTPUT_EXTENSIONS[fmt])
+        if workers > 1 and len(instructions) > PARALLEL_CHUNK:
+            self.assemble_to_hack_parallel(instructions, output_filename, fmt, workers)
+        else:
+            self.assemble_to_hack(instructions, output_filename, fmt)
+        return output_filename
+
+    def assemble_streaming(self, filename, fmt='hack'):
+        """
+        Same as assemble, but reads the file twice instead of keeping it in memory: once for the labels and once to
+        translate and write each instruction.
+
+        input: filename: string, fmt: string
+        output: string -> name of the output file
+        """
+        count = self.scan_labels(filename)
+        output_filename = filename.replace('.asm', OUTPUT_EXTENSIONS[fmt])
+        self.stream_to_hack(filename, output_filename, fmt, count)
+        return output_filename
 
-    # Write to .hack file
-    with open(output_filename, 'w') as f:
-        for binary_instruction in binary_instructions:
-            f.write(binary_instruction + '\n')
 
 # Main function to assemble .asm to .hack
-def assemble(filename):
+def assemble(filename, fmt='hack'):
     """
-    Assembles a file from asm to machine language. Writes the result to a .hack file. 
+    Assembles a file from asm to machine language with a fresh Assembler. Writes the result to a .hack file (or
+    .bin/.npy for the binary formats).
 
-    input: filename: string
+    input: filename: string, fmt: string
     output: None
     """
-    instructions = parse_assembly(filename)
-    instructions = first_pass(instructions)  # Resolve labels in the first pass
-    output_filename = filename.replace('.asm', '.hack')
-    assemble_to_hack(instructions, output_filename)
+    output_filename = Assembler().assemble(filename, fmt)
     print(f'Assembly complete. Output written to {output_filename}')
 
-filename = str(sys.argv[1])
-assemble(filename)
\ No newline at end of file
+def assemble_file(filename, fmt='hack', stream=False, workers=1, mapped=False, source_map=False):
+    """
+    Assembles one file with a fresh Assembler, and with source_map also writes its source map. Module level so a
+    process pool can run it.
+
+    input: filename: string, fmt: string, stream: bool, workers: int, mapped: bool, source_map: bool
+    output: string -> name of the output file
+    """
+    if stream:
+        output_filename = Assembler().assemble_streaming(filename, fmt)
+    else:
+        output_filename = Assembler().assemble(filename, fmt, workers, mapped)
+    if source_map:
+        write_source_map(filename, output_filename, mapped)
+    return output_filename
+
+def assemble_many(filenames, fmt='hack', stream=False, jobs=1, workers=1, mapped=False, source_map=False):
+    """
+    Assembles many files, across a pool of jobs worker processes when jobs is more than 1. Results come back in the
+    order of filenames; a file that fails is reported with its exception instead of stopping the others. workers,
+    mapped and source_map are passed on to assemble_file for each file.
+
+    input: filenames: list[string], fmt: string, stream: bool, jobs: int, workers: int, mapped: bool,
+           source_map: bool
+    output: list[tuple[string, string or Exception]] -> (input file, output file or the error)
+    """
+    results = []
+    if jobs > 1 and len(filenames) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [pool.submit(assemble_file, filename, fmt, stream, workers, mapped, source_map)
+                       for filename in filenames]
+            for filename, future in zip(filenames, futures):
+                try:
+                    results.append((filename, future.result()))
+                except Exception as e:
+                    results.append((filename, e))
+    else:
+        for filename in filenames:
+            try:
+                results.append((filename, assemble_file(filename, fmt, stream, workers, mapped, source_map)))
+            except Exception as e:
+                results.append((filename, e))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Assembles Hack .asm files.")
+    parser.add_argument('files', nargs='+', help=".asm files to assemble")
+    parser.add_argument('--format', default='hack', choices=list(OUTPUT_EXTENSIONS),
+                        help="output format (default hack text)")
+    parser.add_argument('--stream', action='store_true', help="read each file twice instead of holding it in memory")
+    parser.add_argument('--jobs', '-j', type=int, default=1, metavar='N',
+                        help="assemble up to N files at once in separate processes")
+    parser.add_argument('--workers', '-w', type=int, default=1, metavar='N',
+                        help="split the second pass of each large file across N processes")
+    parser.add_argument('--mmap', action='store_true', help="memory map each file and clean it as bytes")
+    parser.add_argument('--source-map', action='store_true',
+                        help="also write a .map tracing each ROM address to its .asm (and .vm, .jack) line")
+    args = parser.parse_args()
+    if args.stream and args.workers > 1:
+        parser.error("--workers needs the whole program in memory and cannot be used with --stream")
+    if args.stream and args.mmap:
+        parser.error("--mmap reads the whole program at once and cannot be used with --stream")
+
+    failed = False
+    results = assemble_many(args.files, args.format, args.stream, args.jobs, args.workers, args.mmap, args.source_map)
+    for filename, result in results:
+        if isinstance(result, Exception):
+            failed = True
+            print(f'Error assembling {filename}: {type(result).__name__}: {result}', file=sys.stderr)
+        else:
+            print(f'Assembly complete. Output written to {result}')
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Corpus sizes in instructions, from a small program up to far past what the 32K word Hack ROM can hold
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Share of instructions that are C-instructions, @variable references and @label references; the rest are
+# @constant loads. A label is declared every 1/labels instructions, so labels also sets the label density
+PROFILES = {
+    'typical': {'c': 0.6, 'variables': 0.1, 'labels': 0.05},
+    'c-heavy': {'c': 0.9, 'variables': 0.02, 'labels': 0.01},
+    'label-heavy': {'c': 0.5, 'variables': 0.05, 'labels': 0.25},
+    'variable-heavy': {'c': 0.5, 'variables': 0.4, 'labels': 0.02},
+}
+
+# C-instructions drawn from the ones the VM translator and compiled programs use most
+C_SAMPLE = ['D=M', 'D=A', 'M=D', 'A=M', 'AM=M-1', 'M=M+1', 'M=M-1', 'D=D+M', 'D=D-M', 'D=M-D', 'A=A-1', 'M=0',
+            'M=-1', 'MD=M+1', 'D=D+A', 'M=D+M', 'M=!M', 'D;JEQ', 'D;JGT', 'D;JLT', 'D;JNE', '0;JMP']
+
+ROM_SIZE = 32768
+# Distinct variable names are capped so they all fit below SCREEN, which RealAssembler's allocator requires
+MAX_VARIABLES = 16000
+IMPLEMENTATIONS = ['assembler', 'assembler-stream', 'assembler-mmap', 'real']
+
+
+def generate_corpus(filename, size, profile, seed=0):
+    """
+    Writes a synthetic .asm program of size instructions with the instruction mix of profile. Labels are declared
+    throughout the file, but only labels that land inside the Hack ROM are referenced, since an A-instruction can
+    only hold a 15 bit address. Every tenth line gets a trailing comment so comment stripping is timed too.
+
+    input: filename: string, size: int, profile: dict, seed: int
+    output: None
+    """
+    rng = random.Random(seed)
+    c, variables, labels = profile['c'], profile['variables'], profile['labels']
+    spacing = max(1, round(1 / labels))
+    reachable_labels = max(1, (min(size, ROM_SIZE) - 1) // spacing + 1)
+    variable_names = max(1, min(MAX_VARIABLES, int(size * variables) // 8))
+
+    lines = []
+    with open(filename, 'w') as f:
+        for i in range(size):
+            if i % spacing == 0:
+                lines.append(f'(L{i // spacing})')
+            r = rng.random()
+            if r < c:
+                line = rng.choice(C_SAMPLE)
+            elif r < c + variables:
+                line = f'@v{rng.randrange(variable_names)}'
+            elif r < c + variables + labels:
+                line = f'@L{rng.randrange(reachable_labels)}'
+            else:
+                line = f'@{rng.randrange(ROM_SIZE)}'
+            if i % 10 == 0:
+                line += ' // comment'
+            lines.append(line)
+            if len(lines) >= 1 << 16:
+                f.write('\n'.join(lines) + '\n')
+                lines = []
+        if lines:
+            f.write('\n'.join(lines) + '\n')
+
+
+def run_implementation(name, filename, output_filename):
+    """
+    Assembles filename with one implementation and returns the wall time. Runs inside a fresh process so the peak
+    RSS measured afterwards belongs to this run alone.
+
+    input: name: string, filename: string, output_filename: string
+    output: float seconds
+    """
+    if name == 'real':
+        import RealAssembler
+        start = time.perf_counter()
+        with open(output_filename, 'w') as f:
+            for op in RealAssembler.Parser(filename).assemble_binary():
+                f.write(str(op) + '\n')
+        return time.perf_counter() - start
+
+    import Assembler
+    start = time.perf_counter()
+    if name == 'assembler-stream':
+        written = Assembler.Assembler().assemble_streaming(filename)
+    elif name == 'assembler-mmap':
+        written = Assembler.Assembler().assemble(filename, mapped=True)
+    else:
+        written = Assembler.Assembler().assemble(filename)
+    seconds = time.perf_counter() - start
+    os.replace(written, output_filename)
+    return seconds
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process. ru_maxrss is in kilobytes on Linux and bytes on macOS.
+
+    output: int
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(name, filename, output_filename):
+    """
+    Runs one implementation on filename in a child process and returns its seconds and peak RSS.
+
+    input: name: string, filename: string, output_filename: string
+    output: dict
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, os.path.abspath(__file__), '--run', name, filename, output_filename],
+                            cwd=here, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def file_sha256(filename):
+    """
+    Hashes a file, so the results show whether every implementation wrote the same program.
+
+    input: filename: string
+    output: string
+    """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def benchmark(sizes, profiles, implementations, repeat=1, seed=0):
+    """
+    Generates a corpus for every size and profile and times each implementation on it. Each result keeps the best
+    time of repeat runs and the largest peak RSS among them.
+
+    input: sizes: list[int], profiles: list[string], implementations: list[string], repeat: int, seed: int
+    output: dict -> the JSON report
+    """
+    results = []
+    workdir = tempfile.mkdtemp(prefix='asm-bench-')
+    try:
+        for profile in profiles:
+            for size in sizes:
+                corpus = os.path.join(workdir, f'{profile}-{size}.asm')
+                generate_corpus(corpus, size, PROFILES[profile], seed)
+                for name in implementations:
+                    output_filename = os.path.join(workdir, f'{profile}-{size}.{name}.hack')
+                    runs = [measure(name, corpus, output_filename) for _ in range(repeat)]
+                    seconds = min(run['seconds'] for run in runs)
+                    results.append({
+                        'implementation': name,
+                        'profile': profile,
+                        'instructions': size,
+                        'seconds': round(seconds, 6),
+                        'instructions_per_sec': round(size / seconds) if seconds else None,
+                        'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+                        'output_sha256': file_sha256(output_filename),
+                    })
+                    os.remove(output_filename)
+                    print(f'{profile:<15} {size:>10} {name:<17} {seconds:>9.3f}s', file=sys.stderr)
+                os.remove(corpus)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'repeat': repeat,
+        'profiles': {profile: PROFILES[profile] for profile in profiles},
+        'results': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times Assembler.py against RealAssembler.py on synthetic .asm "
+                                                 "programs and reports the results as JSON.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, metavar='N',
+                        help="corpus sizes in instructions (default 10k to 10M)")
+    parser.add_argument('--profiles', nargs='+', default=list(PROFILES), choices=list(PROFILES),
+                        help="instruction mixes to generate (default all)")
+    parser.add_argument('--implementations', nargs='+', default=IMPLEMENTATIONS, choices=IMPLEMENTATIONS,
+                        help="assemblers to time (default all)")
+    parser.add_argument('--repeat', type=int, default=1, help="runs per measurement, keeping the fastest")
+    parser.add_argument('--seed', type=int, default=0, help="seed for the corpus generator")
+    parser.add_argument('--output', '-o', help="write the JSON report here instead of to stdout")
+    parser.add_argument('--run', nargs=3, metavar=('IMPLEMENTATION', 'INPUT', 'OUTPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        seconds = run_implementation(*args.run)
+        print(json.dumps({'seconds': seconds, 'peak_rss_bytes': peak_rss_bytes()}))
+        return
+
+    report = benchmark(args.sizes, args.profiles, args.implementations, args.repeat, args.seed)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
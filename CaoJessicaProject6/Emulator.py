@@ -0,0 +1,668 @@
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from array import array
+try:
+    import numpy as np
+except ImportError:  # only BatchEmulator needs NumPy
+    np = None
+from Assembler import COMP_TABLE, DEST_TABLE, JUMP_TABLE, OUTPUT_EXTENSIONS, SYMBOL_TABLE, Assembler, parse_assembly
+
+RAM_SIZE = 32768
+ROM_SIZE = 32768
+ADDRESS_MASK = ROM_SIZE - 1
+
+def wrap(expression):
+    """
+    Wraps the Python source of an integer expression so its value is cut back to a signed 16-bit word, the way the
+    Hack ALU overflows.
+
+    input: expression: string
+    output: string
+    """
+    return f'({expression} + 32768 & 65535) - 32768'
+
+# What each comp mnemonic computes from the D register d, the A register a and M = RAM[A] m, as Python source. On
+# int16 NumPy arrays these overflow the way the Hack ALU does
+COMP_OPERATIONS = {
+    '0': '0', '1': '1', '-1': '-1', 'D': 'd', 'A': 'a', '!D': '~d', '!A': '~a', '-D': '-d', '-A': '-a',
+    'D+1': 'd + 1', 'A+1': 'a + 1', 'D-1': 'd - 1', 'A-1': 'a - 1', 'D+A': 'd + a', 'D-A': 'd - a', 'A-D': 'a - d',
+    'D&A': 'd & a', 'D|A': 'd | a', 'M': 'm', '!M': '~m', '-M': '-m', 'M+1': 'm + 1', 'M-1': 'm - 1',
+    'D+M': 'd + m', 'D-M': 'd - m', 'M-D': 'm - d', 'D&M': 'd & m', 'D|M': 'd | m',
+}
+# The same for Python ints. Only operations that can leave the 16-bit range are wrapped; ~, & and | of signed
+# 16-bit values stay inside it
+COMP_EXPRESSIONS = {mnemonic: wrap(operation) if mnemonic not in ('0', '1', '-1') and re.search('[+-]', operation)
+                    else operation for mnemonic, operation in COMP_OPERATIONS.items()}
+
+# Comp bits (the a bit and c1..c6) -> Python source of the result
+COMP_SOURCE = {int(COMP_TABLE[mnemonic], 2): expression for mnemonic, expression in COMP_EXPRESSIONS.items()}
+# Comp bits -> function(d, a, m) returning the result
+COMP_FUNCTIONS = {comp: eval(f'lambda d, a, m: {expression}') for comp, expression in COMP_SOURCE.items()}
+
+# Bits of the jump field that are taken when the result is negative, zero or positive
+JUMP_LT, JUMP_EQ, JUMP_GT = 4, 2, 1
+# Bits of the dest field
+DEST_M, DEST_D, DEST_A = 1, 2, 4
+# Jump bits -> Python condition on out under which the jump is taken
+JUMP_CONDITIONS = {1: 'out > 0', 2: 'out == 0', 3: 'out >= 0', 4: 'out < 0', 5: 'out != 0', 6: 'out <= 0', 7: 'True'}
+
+# Longest basic block the compiled mode generates, so a block never runs far past the cycles asked for
+MAX_BLOCK = 64
+# Small programs --check-jit runs before the program itself, where compiled blocks are easy to get wrong: a
+# conditional jump onto the end loop right after its own block, taken and not taken
+JIT_CHECKS = {
+    'jump taken onto the end loop after the block': ['@END', 'D;JEQ', '(END)', '@END', '0;JMP'],
+    'jump not taken, falling into the end loop': ['D=1', '@END', 'D;JEQ', '(END)', '@END', '0;JMP'],
+}
+# run() sizes --check-jit steps both modes by, so blocks get cut short at every kind of point
+CHECK_STEPS = [1, 2, 3, 7, 50, 1000, 20000]
+
+def alu_function(comp, wrapped=True):
+    """
+    Builds the function for comp bits that have no mnemonic by running the Hack ALU on its control bits
+    (a zx nx zy ny f no). Real programs only use the mnemonics, but the CPU still executes anything. Pass wrapped=False
+    for int16 NumPy arrays, which overflow by themselves.
+
+    input: comp: int, wrapped: bool
+    output: function(d, a, m) -> int
+    """
+    zx, nx, zy, ny, f, no = [(comp >> shift) & 1 for shift in range(5, -1, -1)]
+    uses_m = comp >> 6
+
+    def alu(d, a, m):
+        x, y = d, (m if uses_m else a)
+        if zx:
+            x = 0
+        if nx:
+            x = ~x
+        if zy:
+            y = 0
+        if ny:
+            y = ~y
+        if f:
+            out = ((x + y + 32768) & 65535) - 32768 if wrapped else x + y
+        else:
+            out = x & y
+        return ~out if no else out
+    return alu
+
+def decode(word):
+    """
+    Decodes one instruction word into the tuple the fetch/execute loop dispatches on: (comp function or None for an
+    A-instruction, value loaded by an A-instruction, dest bits, jump bits).
+
+    input: word: int
+    output: tuple
+    """
+    word &= 65535
+    if word < 32768:
+        return (None, word, 0, 0)
+    comp = (word >> 6) & 127
+    function = COMP_FUNCTIONS.get(comp) or alu_function(comp)
+    return (function, 0, (word >> 3) & 7, word & 7)
+
+def read_rom(filename, fmt=None):
+    """
+    Reads a program written by Assembler.py. fmt is one of its output formats and defaults to the one the file
+    extension belongs to ('le' for .bin).
+
+    input: filename: string, fmt: string
+    output: array('H') -> instruction words
+    """
+    if fmt is None:
+        extension = os.path.splitext(filename)[1]
+        fmt = 'le' if extension == '.bin' else next(
+            (name for name, ext in OUTPUT_EXTENSIONS.items() if ext == extension), 'hack')
+    if fmt == 'hack':
+        with open(filename, 'r') as f:
+            return array('H', [int(line, 2) for line in f.read().split()])
+    with open(filename, 'rb') as f:
+        data = f.read()
+    if fmt == 'npy':
+        header_length = int.from_bytes(data[8:10], 'little')
+        data = data[10 + header_length:]
+    words = array('H', data)
+    if (fmt == 'be') != (sys.byteorder == 'big'):
+        words.byteswap()
+    return words
+
+def assemble_with_labels(filename):
+    """
+    Assembles an .asm file in memory, returning the instruction words and the labels the first pass found.
+
+    input: filename: string
+    output: tuple[array('H'), dict[string, int]] -> (words, label -> ROM address)
+    """
+    return assemble_lines(parse_assembly(filename))
+
+def assemble_lines(lines):
+    """
+    Assembles cleaned lines of assembly in memory, like assemble_with_labels.
+
+    input: lines: list[string]
+    output: tuple[array('H'), dict[string, int]] -> (words, label -> ROM address)
+    """
+    assembler = Assembler()
+    instructions = assembler.first_pass(lines)
+    labels = {symbol: address for symbol, address in assembler.symbol_table.items() if symbol not in SYMBOL_TABLE}
+    words = array('H', [assembler.encode(instruction) for instruction in instructions])
+    return words, labels
+
+
+class Emulator:
+    """
+    Runs Hack programs. The ROM is decoded once at load into a dispatch table of tuples, one per address, so the
+    fetch/execute loop in run never looks at instruction bits. RAM and ROM are 32K words of array('h') and
+    array('H').
+
+    A program is treated as halted when it jumps to its own end loop, an A-instruction loading its own address
+    followed by 0;JMP (how Hack programs finish, "(END) @END 0;JMP").
+
+    With jit, run executes compiled basic blocks instead (see compile_block). A block runs from its entry address to
+    the first jump, the next leader (a label address, when known) or MAX_BLOCK instructions, and is compiled the first
+    time control reaches that address. Jumping into the middle of a block just compiles a new block from there.
+    """
+
+    def __init__(self, words=(), jit=False, leaders=()):
+        self.ram = array('h', bytes(2 * RAM_SIZE))
+        self.jit = jit
+        self.load(words, leaders)
+
+    @classmethod
+    def from_file(cls, filename, fmt=None, jit=False):
+        """
+        Creates an Emulator with the program in filename loaded.
+
+        input: filename: string, fmt: string, jit: bool
+        output: Emulator
+        """
+        return cls(read_rom(filename, fmt), jit)
+
+    @classmethod
+    def from_asm(cls, filename, jit=False):
+        """
+        Assembles an .asm file in memory and creates an Emulator with it loaded. The label addresses from the first
+        pass become the block leaders of the compiled mode.
+
+        input: filename: string, jit: bool
+        output: Emulator
+        """
+        words, labels = assemble_with_labels(filename)
+        return cls(words, jit, set(labels.values()))
+
+    def load(self, words, leaders=()):
+        """
+        Loads a program into ROM, decodes it and resets the CPU. Unused ROM holds 0, which is @0. leaders are
+        addresses compiled blocks must start at, such as labels; jump targets are always found at run time anyway.
+
+        input: words: iterable[int], leaders: iterable[int]
+        output: None
+        """
+        words = array('H', words)
+        if len(words) > ROM_SIZE:
+            raise ValueError(f'program has {len(words)} instructions, ROM holds {ROM_SIZE}')
+        self.rom = words + array('H', bytes(2 * (ROM_SIZE - len(words))))
+        program = [decode(word) for word in words]
+        program.extend([decode(0)] * (ROM_SIZE - len(program)))
+        self.program = program
+        # End loops: @n at address n, then 0;JMP
+        end_loop = int(f"111{COMP_TABLE['0']}{DEST_TABLE['']}{JUMP_TABLE['JMP']}", 2)
+        self.halts = {pc for pc in range(len(words) - 1) if words[pc] == pc and words[pc + 1] == end_loop}
+        self.leaders = set(leaders)
+        # Entry address -> (block function, instructions in the block)
+        self.blocks = {}
+        self.reset()
+
+    def reset(self):
+        """
+        Resets the registers and the cycle count, like the reset pin. RAM is left as it is.
+
+        output: None
+        """
+        self.a = 0
+        self.d = 0
+        self.pc = 0
+        self.cycles = 0
+        self.halted = False
+
+    def run(self, cycles):
+        """
+        Executes up to cycles instructions, stopping early if the program reaches its end loop. Uses compiled blocks
+        when the Emulator was made with jit.
+
+        input: cycles: int
+        output: int -> number of instructions executed
+        """
+        if self.jit:
+            return self.run_compiled(cycles)
+        return self.interpret(cycles)
+
+    def interpret(self, cycles):
+        """
+        The fetch/execute loop: executes up to cycles instructions one at a time from the decoded ROM.
+
+        input: cycles: int
+        output: int -> number of instructions executed
+        """
+        if self.halted:
+            return 0
+        program = self.program
+        ram = self.ram
+        halts = self.halts
+        a, d, pc = self.a, self.d, self.pc
+        executed = 0
+        while executed < cycles:
+            comp, value, dest, jump = program[pc]
+            executed += 1
+            if comp is None:
+                a = value
+                pc = (pc + 1) & ADDRESS_MASK
+                continue
+            address = a & ADDRESS_MASK
+            out = comp(d, a, ram[address])
+            if dest:
+                if dest & DEST_M:
+                    ram[address] = out
+                if dest & DEST_D:
+                    d = out
+                if dest & DEST_A:
+                    a = out
+            if jump and jump & (JUMP_LT if out < 0 else JUMP_EQ if out == 0 else JUMP_GT):
+                pc = address  # PC loads the A register as it was before this instruction
+                if pc in halts:
+                    self.halted = True
+                    break
+            else:
+                pc = (pc + 1) & ADDRESS_MASK
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += executed
+        return executed
+
+    def run_compiled(self, cycles):
+        """
+        Executes up to cycles instructions a basic block at a time. When the next block is longer than the cycles
+        left, the rest are interpreted, so exactly as many instructions run as in interpret.
+
+        input: cycles: int
+        output: int -> number of instructions executed
+        """
+        if self.halted:
+            return 0
+        blocks = self.blocks
+        ram = self.ram
+        halts = self.halts
+        a, d, pc = self.a, self.d, self.pc
+        remaining = cycles
+        while True:
+            block = blocks.get(pc)
+            if block is None:
+                block = self.compile_block(pc)
+            function, length = block
+            if length > remaining:
+                break
+            a, d, pc, jumped = function(a, d, ram)
+            remaining -= length
+            if jumped and pc in halts:  # jumped into an end loop, even one right after the block
+                self.halted = True
+                break
+        self.a, self.d, self.pc = a, d, pc
+        self.cycles += cycles - remaining
+        if self.halted or not remaining:
+            return cycles - remaining
+        return cycles - remaining + self.interpret(remaining)
+
+    def compile_block(self, start):
+        """
+        Compiles the basic block that starts at start into a Python function and caches it by its entry address.
+
+        input: start: int
+        output: tuple -> (function(a, d, ram) returning (a, d, pc, whether the jump was taken), instructions in it)
+        """
+        source, length, namespace = self.block_source(start)
+        exec(compile(source, f'<hack block {start}>', 'exec'), namespace)
+        block = (namespace[f'block_{start}'], length)
+        self.blocks[start] = block
+        return block
+
+    def block_source(self, start):
+        """
+        Generates the source of the function for the block at start: straight-line Python updating a, d and ram,
+        returning the registers, the next PC and whether the block's jump was taken. The value of A is tracked while
+        generating, so after @value the following instructions use value and ram[value] as constants and A is only
+        assigned once, on the way out.
+
+        input: start: int
+        output: tuple[string, int, dict] -> (source, instructions in the block, globals the source needs)
+        """
+        rom = self.rom
+        namespace = {}
+        body = []
+        known = None  # value of A while it is a compile time constant, else None and A lives in the variable a
+        address_set = False  # whether the variable address already holds a & 32767 for the current a
+        pc = start
+        while True:
+            word = rom[pc]
+            pc += 1
+            if word < 32768:
+                known = word
+            else:
+                comp, dest, jump = (word >> 6) & 127, (word >> 3) & 7, word & 7
+                a_value = str(known) if known is not None else 'a'
+                address = str(known) if known is not None else 'address'
+                if known is None and not address_set and (dest & DEST_M or 'm' in COMP_SOURCE.get(comp, 'm') or jump):
+                    body.append('address = a & 32767')
+                    address_set = True
+                if comp in COMP_SOURCE:
+                    expression = re.sub(r'\ba\b', a_value, COMP_SOURCE[comp])
+                    expression = re.sub(r'\bm\b', f'ram[{address}]', expression)
+                else:
+                    namespace[f'alu_{pc - 1}'] = alu_function(comp)
+                    expression = f'alu_{pc - 1}(d, {a_value}, ram[{address}])'
+                targets = [f'ram[{address}]'] * (dest & DEST_M) + ['d'] * (dest & DEST_D > 0) + \
+                    ['a'] * (dest & DEST_A > 0)
+                conditional = jump and jump != 7
+                if (conditional and targets) or len(targets) > 1:
+                    body.append(f'out = {expression}')
+                    expression = 'out'
+                for target in targets:
+                    body.append(f'{target} = {expression}')
+                if dest & DEST_A:
+                    known = None
+                    address_set = False
+                a_out = str(known) if known is not None else 'a'
+                if conditional:
+                    condition = JUMP_CONDITIONS[jump]
+                    if expression != 'out':  # nothing stored the result, so test the expression itself
+                        condition = condition.replace('out', f'({expression})')
+                    body.append(f'if {condition}:')
+                    body.append(f'    return {a_out}, d, {address}, True')
+                    break
+                if jump:
+                    body.append(f'return {a_out}, d, {address}, True')
+                    return self.block_function(start, body), pc - start, namespace
+            if pc >= ROM_SIZE or pc in self.leaders or pc - start >= MAX_BLOCK:
+                break
+        a_out = str(known) if known is not None else 'a'
+        body.append(f'return {a_out}, d, {pc & ADDRESS_MASK}, False')  # PC wraps around at the end of ROM
+        return self.block_function(start, body), pc - start, namespace
+
+    @staticmethod
+    def block_function(start, body):
+        """
+        Wraps the lines of a block body into the source of its function definition.
+
+        input: start: int, body: list[string]
+        output: string
+        """
+        return f'def block_{start}(a, d, ram):\n' + ''.join(f'    {line}\n' for line in body)
+
+
+class BatchEmulator:
+    """
+    Runs one Hack program on many machines at once, for running a test program against many initial RAM states. Needs
+    NumPy: RAM is a (instances, 32768) int16 array and A, D and PC are arrays with one entry per instance.
+
+    All instances step in lockstep, one instruction per step. While they agree on PC (the usual case, until data
+    makes a conditional jump go different ways) an instruction runs on all of them with whole-array operations;
+    otherwise the running instances are grouped by PC and each group runs its own instruction. Instances that reach
+    their end loop stop, like Emulator.
+    """
+
+    def __init__(self, words=(), instances=1):
+        if np is None:
+            raise ImportError('BatchEmulator needs NumPy')
+        self.instances = instances
+        self.rows = np.arange(instances)
+        self.ram = np.zeros((instances, RAM_SIZE), np.int16)
+        self.load(words)
+
+    @classmethod
+    def from_file(cls, filename, instances, fmt=None):
+        """
+        Creates a BatchEmulator with the program in filename loaded on every instance.
+
+        input: filename: string, instances: int, fmt: string
+        output: BatchEmulator
+        """
+        return cls(read_rom(filename, fmt), instances)
+
+    def load(self, words):
+        """
+        Loads a program into ROM, decodes it for whole-array execution and resets every instance.
+
+        input: words: iterable[int]
+        output: None
+        """
+        words = array('H', words)
+        if len(words) > ROM_SIZE:
+            raise ValueError(f'program has {len(words)} instructions, ROM holds {ROM_SIZE}')
+        self.rom = words
+        program = [self.decode(word) for word in words]
+        program.extend([self.decode(0)] * (ROM_SIZE - len(program)))
+        self.program = program
+        self.halts = np.array(sorted(Emulator(words).halts), dtype=np.int16)
+        self.reset()
+
+    @staticmethod
+    def decode(word):
+        """
+        Decodes one instruction word into (comp function or None for an A-instruction, value loaded by an
+        A-instruction, dest bits, jump test or None, whether the comp reads M). The functions work on int16 arrays.
+
+        input: word: int
+        output: tuple
+        """
+        if word < 32768:
+            return (None, word, 0, None, False)
+        comp, dest, jump = (word >> 6) & 127, (word >> 3) & 7, word & 7
+        if comp in COMP_SOURCE:
+            mnemonic = next(name for name, bits in COMP_TABLE.items() if int(bits, 2) == comp)
+            function = eval(f'lambda d, a, m: {COMP_OPERATIONS[mnemonic]}')
+        else:
+            function = alu_function(comp, wrapped=False)
+        test = eval(f'lambda out: {JUMP_CONDITIONS[jump]}') if jump else None
+        return (function, 0, dest, test, bool(comp >> 6))
+
+    def reset(self):
+        """
+        Resets the registers of every instance. RAM is left as it is.
+
+        output: None
+        """
+        instances = self.instances
+        self.a = np.zeros(instances, np.int16)
+        self.d = np.zeros(instances, np.int16)
+        self.pc = np.zeros(instances, np.int32)
+        self.halted = np.zeros(instances, bool)
+        self.halt_step = np.zeros(instances, np.int64)
+        self.running = instances
+        self.steps = 0
+
+    @property
+    def cycles(self):
+        """
+        Instructions each instance has executed.
+
+        output: numpy array of int64
+        """
+        return np.where(self.halted, self.halt_step, self.steps)
+
+    def run(self, cycles):
+        """
+        Steps every running instance up to cycles times, stopping early once all of them have halted.
+
+        input: cycles: int
+        output: int -> number of steps taken
+        """
+        pc = self.pc
+        for step in range(cycles):
+            if not self.running:
+                return step
+            if self.running == self.instances and (pc == pc[0]).all():
+                self.execute(int(pc[0]), slice(None))
+            else:
+                active = np.flatnonzero(~self.halted)
+                order = np.argsort(pc[active], kind='stable')
+                grouped = active[order]
+                pcs = pc[grouped]
+                starts = np.flatnonzero(np.diff(pcs, prepend=-1))
+                for start, end in zip(starts, np.append(starts[1:], len(grouped))):
+                    self.execute(int(pcs[start]), grouped[start:end])
+            self.steps += 1
+        return cycles
+
+    def execute(self, pc, index):
+        """
+        Executes the instruction at pc on the instances selected by index (slice(None) for all of them).
+
+        input: pc: int, index: slice or numpy array of int
+        output: None
+        """
+        function, value, dest, test, uses_m = self.program[pc]
+        following = (pc + 1) & ADDRESS_MASK
+        if function is None:
+            self.a[index] = value
+            self.pc[index] = following
+            return
+        rows = self.rows if isinstance(index, slice) else index
+        ram = self.ram
+        a = self.a[index]
+        address = a & ADDRESS_MASK
+        out = function(self.d[index], a, ram[rows, address] if uses_m else None)
+        if dest & DEST_M:
+            ram[rows, address] = out
+        if dest & DEST_D:
+            self.d[index] = out
+        if dest & DEST_A:
+            self.a[index] = out
+        if test is None:
+            self.pc[index] = following
+            return
+        taken = test(out)
+        self.pc[index] = np.where(taken, address, following)
+        stopped = np.logical_and(taken, np.isin(address, self.halts))
+        if stopped.any():
+            stopped_rows = rows[stopped]
+            self.halted[stopped_rows] = True
+            self.halt_step[stopped_rows] = self.steps + 1
+            self.running -= len(stopped_rows)
+
+
+def parse_assignment(text):
+    """
+    Parses a RAM assignment from the command line, "ADDRESS=VALUE".
+
+    input: text: string
+    output: tuple[int, int]
+    """
+    address, value = text.split('=')
+    return int(address), int(value)
+
+def run_batch(words, args):
+    """
+    Runs the command line options on a BatchEmulator and reports instance-cycles per second. Every instance starts
+    from the same --set values, so --show prints the first one.
+
+    input: words: array('H'), args: argparse.Namespace
+    output: None
+    """
+    batch = BatchEmulator(words, args.instances)
+    for address, value in args.set:
+        batch.ram[:, address] = value
+    start = time.perf_counter()
+    steps = batch.run(args.cycles)
+    seconds = time.perf_counter() - start
+    executed = int(batch.cycles.sum())
+    rate = executed / seconds if seconds else float('inf')
+    print(f'{args.instances} instances ({int(batch.halted.sum())} halted) ran {steps} steps, {executed} cycles in '
+          f'{seconds:.3f}s ({rate:,.0f} instance-cycles/sec)')
+    for address in args.show:
+        print(f'RAM[{address}] = {batch.ram[0, address]}')
+
+def check_jit(words, leaders=(), assignments=(), cycles=1_000_000, seed=0):
+    """
+    Runs a program interpreted and as compiled blocks side by side, in randomly sized steps, and compares A, D, PC,
+    RAM, the cycle count and the halt state after every step.
+
+    input: words: iterable[int], leaders: iterable[int], assignments: list[tuple[int, int]] -> RAM set before running,
+           cycles: int, seed: int
+    output: string or None -> the first difference, or None if both modes agree
+    """
+    rng = random.Random(seed)
+    machines = [Emulator(words, jit, leaders) for jit in (False, True)]
+    for emulator in machines:
+        for address, value in assignments:
+            emulator.ram[address] = value
+    interpreted, compiled = machines
+    done = 0
+    while done < cycles and not interpreted.halted:
+        step = min(rng.choice(CHECK_STEPS), cycles - done)
+        counts = [emulator.run(step) for emulator in machines]
+        states = [(emulator.a, emulator.d, emulator.pc, emulator.cycles, emulator.halted) for emulator in machines]
+        if counts[0] != counts[1] or states[0] != states[1] or interpreted.ram != compiled.ram:
+            return (f'run({step}) after {done} cycles: interpreted ran {counts[0]} to (a, d, pc, cycles, halted) = '
+                    f'{states[0]}, compiled ran {counts[1]} to {states[1]}')
+        done += counts[0]
+    return None
+
+def run_checks(emulator, args):
+    """
+    Runs check_jit on the JIT_CHECKS programs and then on the program given on the command line.
+
+    input: emulator: Emulator, args: argparse.Namespace
+    output: bool -> whether every check passed
+    """
+    programs = []
+    for name, lines in JIT_CHECKS.items():
+        words, labels = assemble_lines(lines)
+        programs.append((name, words, labels.values(), []))
+    programs.append((args.file, emulator.rom, emulator.leaders, args.set))
+    passed = True
+    for name, words, leaders, assignments in programs:
+        difference = check_jit(words, leaders, assignments, args.cycles)
+        print(f'{name}: {difference or "ok"}')
+        passed = passed and difference is None
+    return passed
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a Hack program and reports how fast it ran.")
+    parser.add_argument('file', help=".hack (or .bin/.npy) program written by Assembler.py, or an .asm file")
+    parser.add_argument('--format', choices=list(OUTPUT_EXTENSIONS), help="format of the file (default from extension)")
+    parser.add_argument('--cycles', '-n', type=int, default=10_000_000, help="most instructions to run")
+    parser.add_argument('--set', type=parse_assignment, action='append', default=[], metavar='ADDRESS=VALUE',
+                        help="set a RAM word before running (repeatable)")
+    parser.add_argument('--show', type=int, action='append', default=[], metavar='ADDRESS',
+                        help="print a RAM word after running (repeatable)")
+    parser.add_argument('--jit', action='store_true', help="run compiled basic blocks instead of interpreting")
+    parser.add_argument('--check-jit', action='store_true',
+                        help="instead of timing, check that interpreting and compiled blocks agree step by step")
+    parser.add_argument('--instances', type=int, default=0, metavar='K',
+                        help="run K copies in lockstep with BatchEmulator (needs NumPy)")
+    args = parser.parse_args()
+
+    if args.file.endswith('.asm'):
+        emulator = Emulator.from_asm(args.file, args.jit)
+    else:
+        emulator = Emulator.from_file(args.file, args.format, args.jit)
+    if args.instances:
+        run_batch(emulator.rom, args)
+        return
+    if args.check_jit:
+        sys.exit(0 if run_checks(emulator, args) else 1)
+    for address, value in args.set:
+        emulator.ram[address] = value
+    start = time.perf_counter()
+    executed = emulator.run(args.cycles)
+    seconds = time.perf_counter() - start
+    rate = executed / seconds if seconds else float('inf')
+    state = 'halted' if emulator.halted else 'stopped'
+    print(f'{state} after {executed} cycles in {seconds:.3f}s ({rate:,.0f} cycles/sec)')
+    for address in args.show:
+        print(f'RAM[{address}] = {emulator.ram[address]}')
+
+if __name__ == "__main__":
+    main()
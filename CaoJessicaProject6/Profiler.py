@@ -0,0 +1,258 @@
+import argparse
+import bisect
+import re
+import sys
+from collections import Counter, defaultdict
+from Emulator import ADDRESS_MASK, DEST_A, DEST_D, DEST_M, JUMP_EQ, JUMP_GT, JUMP_LT, ROM_SIZE, Emulator, \
+    assemble_with_labels
+
+# Labels that may be VM functions: Class.function, as VMp2.translate_function and the Jack compiler name them. Labels
+# inside a function (Class.function$label) are not functions
+FUNCTION_LABEL = re.compile(r'^[^$]+\.[^$]+$')
+# Name for cycles spent before the first function is called (bootstrap code)
+STARTUP = '(startup)'
+
+
+class Profiler:
+    """
+    Runs an Emulator while counting how often each ROM address executes, and follows VM function calls to build a
+    call graph and flame graph stacks.
+
+    A call is a jump to a function label taken while SP == LCL, which is how every VM call leaves the stack right
+    before jumping (a jump back to a loop label at the top of a function happens with locals pushed, so SP > LCL).
+    The return address of the new frame is read from the frame the call just pushed, RAM[LCL-5], and a jump to it
+    later is the return. This works whether calls jump straight to the function (VMp2) or through a shared call
+    routine (Pong.asm).
+    """
+
+    def __init__(self, emulator, labels, function_label=FUNCTION_LABEL):
+        self.emulator = emulator
+        self.labels = labels
+        self.counts = [0] * ROM_SIZE
+        # ROM address -> function name, for the labels that look like functions
+        self.entries = {}
+        for name, address in sorted(labels.items(), key=lambda item: item[1]):
+            if function_label.match(name):
+                self.entries.setdefault(address, name)
+        # Shadow call stack of [function, return address, cycle the call happened]
+        self.stack = []
+        self.returns = Counter()
+        self.calls = Counter()
+        self.edges = Counter()
+        self.edge_cycles = Counter()
+        self.folded = Counter()
+        self.mark = 0
+
+    @classmethod
+    def from_asm(cls, filename, function_label=FUNCTION_LABEL):
+        """
+        Assembles filename in memory and creates a Profiler for it with the labels of the first pass.
+
+        input: filename: string, function_label: compiled regular expression
+        output: Profiler
+        """
+        words, labels = assemble_with_labels(filename)
+        return cls(Emulator(words, leaders=labels.values()), labels, function_label)
+
+    def current_stack(self):
+        """
+        Returns the functions on the shadow call stack, outermost first.
+
+        output: list[string]
+        """
+        return [frame[0] for frame in self.stack] or [STARTUP]
+
+    def stack_changed(self, cycle):
+        """
+        Charges the cycles since the last change of the call stack to the stack as it was.
+
+        input: cycle: int
+        output: None
+        """
+        if cycle > self.mark:
+            self.folded[';'.join(self.current_stack())] += cycle - self.mark
+            self.mark = cycle
+
+    def enter(self, function, cycle):
+        """
+        Records a call of function at cycle.
+        """
+        self.stack_changed(cycle)
+        ram = self.emulator.ram
+        return_address = ram[(ram[1] - 5) & ADDRESS_MASK] & ADDRESS_MASK
+        caller = self.stack[-1][0] if self.stack else STARTUP
+        self.calls[function] += 1
+        self.edges[caller, function] += 1
+        self.stack.append([function, return_address, cycle])
+        self.returns[return_address] += 1
+
+    def leave(self, target, cycle):
+        """
+        Records the return to target at cycle, popping every frame down to the one that returns there.
+        """
+        self.stack_changed(cycle)
+        while self.stack:
+            function, return_address, start = self.stack.pop()
+            self.returns[return_address] -= 1
+            caller = self.stack[-1][0] if self.stack else STARTUP
+            if function not in self.current_stack():  # a recursive call is already counted by its outermost frame
+                self.edge_cycles[caller, function] += cycle - start
+            if return_address == target:
+                break
+
+    def run(self, cycles):
+        """
+        Executes up to cycles instructions like Emulator.interpret, profiling as it goes.
+
+        input: cycles: int
+        output: int -> number of instructions executed
+        """
+        emulator = self.emulator
+        if emulator.halted:
+            return 0
+        program = emulator.program
+        ram = emulator.ram
+        halts = emulator.halts
+        counts = self.counts
+        entries = self.entries
+        returns = self.returns
+        a, d, pc = emulator.a, emulator.d, emulator.pc
+        base = emulator.cycles
+        executed = 0
+        while executed < cycles:
+            counts[pc] += 1
+            comp, value, dest, jump = program[pc]
+            executed += 1
+            if comp is None:
+                a = value
+                pc = (pc + 1) & ADDRESS_MASK
+                continue
+            address = a & ADDRESS_MASK
+            out = comp(d, a, ram[address])
+            if dest:
+                if dest & DEST_M:
+                    ram[address] = out
+                if dest & DEST_D:
+                    d = out
+                if dest & DEST_A:
+                    a = out
+            if jump and jump & (JUMP_LT if out < 0 else JUMP_EQ if out == 0 else JUMP_GT):
+                pc = address
+                if pc in entries and ram[0] == ram[1]:
+                    self.enter(entries[pc], base + executed)
+                elif returns[pc] > 0:
+                    self.leave(pc, base + executed)
+                if pc in halts:
+                    emulator.halted = True
+                    break
+            else:
+                pc = (pc + 1) & ADDRESS_MASK
+        emulator.a, emulator.d, emulator.pc = a, d, pc
+        emulator.cycles += executed
+        self.stack_changed(emulator.cycles)
+        return executed
+
+    def label_profile(self):
+        """
+        Groups the execution counts by the nearest label at or before each address.
+
+        output: list[tuple[string, int]] -> (label, cycles), most cycles first
+        """
+        names = {}
+        for name, address in sorted(self.labels.items(), key=lambda item: item[1], reverse=True):
+            names[address] = name  # the first label of several at one address wins
+        addresses = sorted(names)
+        totals = Counter()
+        for pc, count in enumerate(self.counts):
+            if count:
+                i = bisect.bisect_right(addresses, pc) - 1
+                totals[names[addresses[i]] if i >= 0 else STARTUP] += count
+        return totals.most_common()
+
+    def function_profile(self):
+        """
+        Self cycles (spent in the function itself), inclusive cycles (including its callees) and calls per function,
+        from the stacks the run went through.
+
+        output: list[tuple[string, int, int, int]] -> (function, self, inclusive, calls), most self cycles first
+        """
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.folded.items():
+            functions = stack.split(';')
+            own[functions[-1]] += count
+            for function in set(functions):
+                inclusive[function] += count
+        return sorted(((function, own[function], inclusive[function], self.calls[function]) for function in inclusive),
+                      key=lambda row: (-row[1], row[0]))
+
+    def call_graph(self):
+        """
+        Callers and callees of each function, with call counts and the cycles spent in each callee per caller.
+
+        output: dict[string, dict] -> function -> {'callers': [(caller, calls)], 'callees': [(callee, calls, cycles)]}
+        """
+        edge_cycles = self.edge_cycles.copy()
+        callers = [STARTUP] + self.current_stack()
+        for i, (function, _, start) in enumerate(self.stack):  # calls still running count up to now
+            if function not in callers[:i + 1]:
+                edge_cycles[callers[i], function] += self.emulator.cycles - start
+        graph = defaultdict(lambda: {'callers': [], 'callees': []})
+        for (caller, callee), calls in sorted(self.edges.items(), key=lambda item: -item[1]):
+            graph[callee]['callers'].append((caller, calls))
+            graph[caller]['callees'].append((callee, calls, edge_cycles[caller, callee]))
+        return graph
+
+    def folded_stacks(self):
+        """
+        The stacks in the folded format flame graph tools read: "outer;inner;leaf cycles" per line.
+
+        output: string
+        """
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.folded.items()))
+
+    def report(self, limit=20):
+        """
+        Formats the flat label profile, the function profile and the call graph as text, limit rows each.
+
+        input: limit: int
+        output: string
+        """
+        total = sum(self.counts) or 1
+        lines = [f'{total} cycles', '', 'Flat profile by label', f"{'cycles':>12} {'%':>6}  label"]
+        for label, count in self.label_profile()[:limit]:
+            lines.append(f'{count:>12} {100 * count / total:>6.2f}  {label}')
+        lines += ['', 'Functions', f"{'self':>12} {'%':>6} {'inclusive':>12} {'calls':>9}  function"]
+        functions = self.function_profile()
+        for function, own, inclusive, calls in functions[:limit]:
+            lines.append(f'{own:>12} {100 * own / total:>6.2f} {inclusive:>12} {calls:>9}  {function}')
+        lines += ['', 'Call graph']
+        graph = self.call_graph()
+        by_inclusive = sorted(functions, key=lambda row: -row[2])[:limit]
+        for function, own, inclusive, calls in by_inclusive:
+            lines.append(f'{function}  (inclusive {inclusive}, self {own}, calls {calls})')
+            for caller, count in graph[function]['callers']:
+                lines.append(f'    <- {caller} x{count}')
+            for callee, count, cycles in graph[function]['callees']:
+                lines.append(f'    -> {callee} x{count}, {cycles} cycles')
+        return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profiles a Hack program: cycles per label and per VM function, a "
+                                                 "call graph and flame graph stacks.")
+    parser.add_argument('file', help=".asm program (labels come from its first pass)")
+    parser.add_argument('--cycles', '-n', type=int, default=10_000_000, help="most instructions to run")
+    parser.add_argument('--limit', type=int, default=20, help="rows per report section")
+    parser.add_argument('--folded', metavar='FILE', help="write flame graph stacks (folded format) to FILE")
+    args = parser.parse_args()
+
+    profiler = Profiler.from_asm(args.file)
+    profiler.run(args.cycles)
+    sys.stdout.write(profiler.report(args.limit))
+    if args.folded:
+        with open(args.folded, 'w') as f:
+            f.write(profiler.folded_stacks())
+
+if __name__ == "__main__":
+    main()
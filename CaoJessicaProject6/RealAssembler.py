@@ -1,6 +1,9 @@
 #!/usr/bin/env python
 
 import collections
+import mmap
+import os
+import re
 
 PREDEFINED_MEM = {
     "SP": 0,
@@ -81,15 +84,28 @@ COMP = {
     "D|M": "1010101",
 }
 
+# Line comments, matched on the raw bytes of a memory mapped file
+COMMENT_BYTES = re.compile(rb"//[^\n]*")
+
+# "dest=comp;jump" text of every C-instruction -> its binary string, so a CInstruction is one lookup
+C_CODES = {
+    (dest + "=" if dest else "") + comp + (";" + jump if jump else ""):
+        "111{}{}{}".format(COMP[comp], DEST[dest], JUMP[jump])
+    for dest in DEST for comp in COMP for jump in JUMP
+}
+
 
 class Parser():
-    def __init__(self, filename):
+    def __init__(self, filename, mapped=False):
         free_addresses = iter(range(16, PREDEFINED_MEM['SCREEN']-1))
         self.variables = collections.defaultdict(free_addresses.__next__)
         self.labels = dict()
 
-        with open(filename) as f:
-            self.lines = self.preprocess(f)
+        if mapped:
+            self.lines = self.preprocess_mapped(filename)
+        else:
+            with open(filename) as f:
+                self.lines = self.preprocess(f)
 
     def preprocess(self, file):
         lines = []
@@ -104,6 +120,25 @@ class Parser():
                 pass
         return lines
 
+    def preprocess_mapped(self, filename):
+        # mmap the file and drop comments as bytes, so comments are never decoded (the rest is decoded in one go,
+        # see Assembler.map_assembly)
+        with open(filename, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+                tokens = COMMENT_BYTES.sub(b"", source).decode("utf-8").split()
+        # instructions are moved down over the labels in place, so no second list is built
+        count = 0
+        for token in tokens:
+            if token.startswith("("):  # is a label
+                self.labels[token[1:-1]] = count
+            else:
+                tokens[count] = token
+                count += 1
+        del tokens[count:]
+        return tokens
+
     def resolve_symbol(self, symbol):
         if symbol in self.labels:
             return self.labels[symbol]
@@ -136,14 +171,14 @@ class AInstruction():
 
 class CInstruction():
     def __init__(self, code):
-        self.dest, rest = code.split("=") if "=" in code else ("", code)
-        self.comp, self.jump = rest.split(";") if ";" in rest else (rest, "")
+        self.code = C_CODES[code]
 
     def __str__(self):
-        return "111{}{}{}".format(COMP[self.comp], DEST[self.dest],
-                                  JUMP[self.jump])
+        return self.code
+
 
-with open("Max1.hack", 'w') as f:
-    binary_ops = Parser("Max.asm").assemble_binary()
-    for op in binary_ops:
-        f.write(str(op) + '\n')
+if __name__ == "__main__":
+    with open("Max1.hack", 'w') as f:
+        binary_ops = Parser("Max.asm").assemble_binary()
+        for op in binary_ops:
+            f.write(str(op) + '\n')
@@ -0,0 +1,231 @@
+import argparse
+import os
+import struct
+import sys
+import zlib
+try:
+    import numpy as np
+except ImportError:  # Screen needs NumPy; Keyboard and run_with_io do not
+    np = None
+from Assembler import SYMBOL_TABLE
+from Emulator import Emulator
+
+SCREEN = SYMBOL_TABLE['SCREEN']
+KBD = SYMBOL_TABLE['KBD']
+WIDTH = 512
+HEIGHT = 256
+ROW_WORDS = WIDTH // 16
+
+# Hack key codes of the keys that are not printable characters; printable characters use their ASCII code
+KEY_CODES = {
+    'none': 0, 'space': 32, 'newline': 128, 'enter': 128, 'backspace': 129, 'left': 130, 'up': 131, 'right': 132,
+    'down': 133, 'home': 134, 'end': 135, 'pageup': 136, 'pagedown': 137, 'insert': 138, 'delete': 139, 'esc': 140,
+    **{f'f{i}': 140 + i for i in range(1, 13)},
+}
+
+def key_code(key):
+    """
+    Returns the Hack key code for a key name from KEY_CODES, a single character or a number.
+
+    input: key: string
+    output: int
+    """
+    if key.lower() in KEY_CODES:
+        return KEY_CODES[key.lower()]
+    if len(key) == 1:
+        return ord(key)
+    return int(key)
+
+
+class Screen:
+    """
+    The 8K words of the screen memory map seen as a 512x256 bitmap. Each row of the screen is 32 words and the least
+    significant bit of a word is its leftmost pixel; a 1 bit is black.
+
+    update compares the screen memory with what was rendered last time, row by row, and unpacks only the rows that
+    changed, so rendering a frame costs little when little moved.
+    """
+
+    def __init__(self, ram):
+        if np is None:
+            raise ImportError('Screen needs NumPy')
+        # A view of the screen words as little-endian uint16 (no copy), so their bytes unpack in pixel order
+        words = np.frombuffer(ram, dtype=np.int16)[SCREEN:SCREEN + HEIGHT * ROW_WORDS]
+        self.words = words.view(np.uint16).reshape(HEIGHT, ROW_WORDS)
+        self.rendered = np.zeros((HEIGHT, ROW_WORDS), np.uint16)
+        self.pixels = np.zeros((HEIGHT, WIDTH), np.uint8)
+        self.update(all_rows=True)
+
+    def update(self, all_rows=False):
+        """
+        Re-renders the rows of pixels whose words changed since the last update.
+
+        input: all_rows: bool -> render every row regardless
+        output: numpy array of int -> the rows that were rendered
+        """
+        words = self.words
+        if all_rows:
+            dirty = np.arange(HEIGHT)
+        else:
+            dirty = np.flatnonzero((words != self.rendered).any(axis=1))
+        if len(dirty):
+            changed = words[dirty]
+            self.rendered[dirty] = changed
+            packed = changed.astype('<u2').view(np.uint8)
+            self.pixels[dirty] = np.unpackbits(packed, axis=1, bitorder='little')
+        return dirty
+
+    def ppm(self):
+        """
+        Returns the current frame as a binary PPM (P6) image, black pixels on white.
+
+        output: bytes
+        """
+        gray = np.where(self.pixels, 0, 255).astype(np.uint8)
+        rgb = np.repeat(gray[:, :, None], 3, axis=2)
+        return f'P6 {WIDTH} {HEIGHT} 255\n'.encode() + rgb.tobytes()
+
+    def png(self):
+        """
+        Returns the current frame as a 1-bit grayscale PNG image, written with zlib so no imaging library is needed.
+
+        output: bytes
+        """
+        rows = np.packbits(1 - self.pixels, axis=1)  # PNG grayscale: 1 is white, first pixel in the high bit
+        raw = np.hstack([np.zeros((HEIGHT, 1), np.uint8), rows]).tobytes()  # filter type 0 on every row
+
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+        header = struct.pack('>IIBBBBB', WIDTH, HEIGHT, 1, 0, 0, 0, 0)
+        return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(raw)) + \
+            chunk(b'IEND', b'')
+
+    def save(self, filename):
+        """
+        Writes the current frame to filename, as PNG or PPM depending on its extension.
+
+        input: filename: string
+        output: None
+        """
+        data = self.ppm() if filename.endswith('.ppm') else self.png()
+        with open(filename, 'wb') as f:
+            f.write(data)
+
+
+class Keyboard:
+    """
+    Scripted input for the keyboard memory map: a list of (cycle, key code) events, each putting its key code into
+    RAM[KBD] once the emulator has run that many cycles. A code of 0 releases the key.
+    """
+
+    def __init__(self, ram, events=()):
+        self.ram = ram
+        self.events = sorted(events)
+        self.position = 0
+
+    @classmethod
+    def from_script(cls, ram, filename):
+        """
+        Reads a keyboard script with one "CYCLE KEY" event per line, where KEY is a name from KEY_CODES, a single
+        character or a key code. Blank lines and // comments are ignored.
+
+        input: ram: array, filename: string
+        output: Keyboard
+        """
+        events = []
+        with open(filename) as f:
+            for line in f:
+                line = line.split('//')[0].strip()
+                if line:
+                    cycle, key = line.split(maxsplit=1)
+                    events.append((int(cycle), key_code(key)))
+        return cls(ram, events)
+
+    def next_event(self):
+        """
+        Returns the cycle of the next event that has not happened yet, or None.
+
+        output: int or None
+        """
+        if self.position < len(self.events):
+            return self.events[self.position][0]
+        return None
+
+    def apply(self, cycle):
+        """
+        Applies every event due by cycle.
+
+        input: cycle: int
+        output: None
+        """
+        events = self.events
+        while self.position < len(events) and events[self.position][0] <= cycle:
+            self.ram[KBD] = events[self.position][1]
+            self.position += 1
+
+
+def run_with_io(emulator, cycles, keyboard=None, screen=None, frame_every=0, on_frame=None):
+    """
+    Runs an Emulator for up to cycles instructions, stopping exactly at each keyboard event to apply it and every
+    frame_every cycles to update the screen and call on_frame(screen, cycle). The emulator runs at full speed in
+    between.
+
+    input: emulator: Emulator, cycles: int, keyboard: Keyboard, screen: Screen, frame_every: int, on_frame: function
+    output: int -> number of instructions executed
+    """
+    end = emulator.cycles + cycles
+    next_frame = emulator.cycles + frame_every if frame_every else None
+    while emulator.cycles < end and not emulator.halted:
+        if keyboard is not None:
+            keyboard.apply(emulator.cycles)
+        stop = end
+        event = keyboard.next_event() if keyboard is not None else None
+        if event is not None:
+            stop = min(stop, max(event, emulator.cycles + 1))
+        if next_frame is not None:
+            stop = min(stop, next_frame)
+        emulator.run(stop - emulator.cycles)
+        if next_frame is not None and emulator.cycles >= next_frame:
+            if screen is not None:
+                screen.update()
+                if on_frame is not None:
+                    on_frame(screen, emulator.cycles)
+            next_frame += frame_every
+    return cycles - (end - emulator.cycles)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a Hack program headlessly and saves its screen as images.")
+    parser.add_argument('file', help=".hack, .bin, .npy or .asm program")
+    parser.add_argument('--cycles', '-n', type=int, default=10_000_000, help="most instructions to run")
+    parser.add_argument('--keys', help="keyboard script, one \"CYCLE KEY\" event per line")
+    parser.add_argument('--frame-every', type=int, default=0, metavar='CYCLES',
+                        help="save a frame every CYCLES instructions (default only the last frame)")
+    parser.add_argument('--output', '-o', default='frame', help="frame file prefix (default frame)")
+    parser.add_argument('--image', choices=['png', 'ppm'], default='png', help="frame image format")
+    parser.add_argument('--jit', action='store_true', help="run compiled basic blocks")
+    args = parser.parse_args()
+
+    if args.file.endswith('.asm'):
+        emulator = Emulator.from_asm(args.file, args.jit)
+    else:
+        emulator = Emulator.from_file(args.file, jit=args.jit)
+    screen = Screen(emulator.ram)
+    keyboard = Keyboard.from_script(emulator.ram, args.keys) if args.keys else None
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def save_frame(screen, cycle):
+        filename = f'{args.output}{cycle:012d}.{args.image}'
+        screen.save(filename)
+        print(filename)
+
+    executed = run_with_io(emulator, args.cycles, keyboard, screen, args.frame_every, save_frame)
+    if not args.frame_every or executed % args.frame_every:
+        screen.update()
+        save_frame(screen, emulator.cycles)
+    print(f'ran {executed} cycles', file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
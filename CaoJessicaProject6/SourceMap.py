@@ -0,0 +1,192 @@
+import argparse
+import bisect
+import json
+import os
+from itertools import accumulate
+
+MAP_EXTENSION = '.map'
+VERSION = 1
+
+# A source map sidecar (Pong.hack.map next to Pong.hack) is JSON:
+#   {"version": 1, "file": "Pong.hack", "levels": [level, ...]}
+# Level 0 maps each output line (0-based; for .hack the ROM address) to the file it was generated from, level 1 to
+# the file that one was generated from, and so on (.asm, .vm, .jack). A level stores runs of output lines that come
+# from the same source line (1-based) as three columns, each delta encoded against the run before it:
+#   {"sources": ["Main.vm", ...], "out": [...], "source": [...], "line": [...]}
+# Source -1 marks lines that come from nowhere, like the VM bootstrap code. Compile.py --vm --source-map, VMp2.py
+# --source-map and Assembler.py --source-map write this format, each composing the maps of its inputs into its own.
+
+
+def runs(positions):
+    """
+    Collapses the (source index, line) of every output line into runs of equal entries.
+
+    input: positions: list[tuple[int, int] or None]
+    output: tuple[list[int], list[int], list[int]] -> (first output line, source index, line) of each run
+    """
+    starts, indexes, lines = [], [], []
+    previous = ()
+    for position, entry in enumerate(positions):
+        entry = entry or (-1, 0)
+        if entry != previous:
+            starts.append(position)
+            indexes.append(entry[0])
+            lines.append(entry[1])
+            previous = entry
+    return starts, indexes, lines
+
+def deltas(column):
+    """
+    input: column: list[int]
+    output: list[int] -> each value minus the one before it
+    """
+    return [value - previous for previous, value in zip([0] + column, column)]
+
+def encode_level(level):
+    """
+    input: level: tuple[list[string], list[int], list[int], list[int]] -> (sources, starts, indexes, lines)
+    output: dict -> the level as it is stored in the .map file
+    """
+    sources, starts, indexes, lines = level
+    return {'sources': sources, 'out': deltas(starts), 'source': deltas(indexes), 'line': deltas(lines)}
+
+def decode_level(level):
+    """
+    input: dict -> a level as it is stored in the .map file
+    output: tuple[list[string], list[int], list[int], list[int]] -> (sources, starts, indexes, lines)
+    """
+    return (level['sources'], list(accumulate(level['out'])), list(accumulate(level['source'])),
+            list(accumulate(level['line'])))
+
+
+class SourceMap:
+    """
+    The source map of one generated file, resolving its lines to every file up the toolchain with a binary search
+    per level.
+    """
+
+    def __init__(self, filename, levels):
+        self.filename = filename
+        self.directory = os.path.dirname(os.path.abspath(filename))
+        self.levels = levels
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads the source map of a generated file, given the file or its .map sidecar.
+
+        input: filename: string
+        output: SourceMap
+        """
+        if filename.endswith(MAP_EXTENSION):
+            filename = filename[:-len(MAP_EXTENSION)]
+        with open(filename + MAP_EXTENSION) as f:
+            data = json.load(f)
+        if data.get('version') != VERSION:
+            raise ValueError(f'{filename}{MAP_EXTENSION}: unsupported source map version {data.get("version")}')
+        return cls(filename, [decode_level(level) for level in data['levels']])
+
+    @classmethod
+    def build(cls, filename, sources, positions):
+        """
+        Makes the source map of filename from where each of its lines came from. When a source has a map of its
+        own, its levels are composed in below, so the new map reaches as far up the toolchain as its inputs do.
+
+        input: filename: string, sources: list[string] -> paths of the input files,
+               positions: list[tuple[int, int] or None] -> (index in sources, 1-based line) of each output line
+        output: SourceMap
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        inputs = [cls.load(source) if os.path.exists(source + MAP_EXTENSION) else None for source in sources]
+        names = [os.path.relpath(os.path.abspath(source), directory) for source in sources]
+        levels = [(names, *runs(positions))]
+
+        depth = max((len(source_map.levels) for source_map in inputs if source_map), default=0)
+        for level in range(depth):
+            found = {}
+            composed = []
+            for entry in positions:
+                source_map = inputs[entry[0]] if entry else None
+                location = source_map.lookup(entry[1] - 1, level) if source_map else None
+                if location is None:
+                    composed.append(None)
+                    continue
+                name = os.path.relpath(os.path.join(source_map.directory, location[0]), directory)
+                composed.append((found.setdefault(name, len(found)), location[1]))
+            levels.append((list(found), *runs(composed)))
+        return cls(filename, levels)
+
+    def save(self):
+        """
+        Writes the map next to its file as filename + MAP_EXTENSION.
+
+        output: string -> name of the .map file
+        """
+        map_filename = self.filename + MAP_EXTENSION
+        data = {'version': VERSION, 'file': os.path.basename(self.filename),
+                'levels': [encode_level(level) for level in self.levels]}
+        with open(map_filename, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        return map_filename
+
+    def lookup(self, position, level=0):
+        """
+        Finds the source line that an output line comes from at one level, in O(log n) for n runs.
+
+        input: position: int -> 0-based output line or ROM address, level: int
+        output: tuple[string, int] or None -> (source path relative to the map, 1-based line)
+        """
+        if level >= len(self.levels):
+            return None
+        sources, starts, indexes, lines = self.levels[level]
+        run = bisect.bisect_right(starts, position) - 1
+        if run < 0 or indexes[run] < 0:
+            return None
+        return sources[indexes[run]], lines[run]
+
+    def resolve(self, position):
+        """
+        Traces an output line through every level, e.g. a ROM address to its .asm, .vm and .jack lines.
+
+        input: position: int
+        output: list[tuple[string, int] or None] -> one entry per level
+        """
+        return [self.lookup(position, level) for level in range(len(self.levels))]
+
+
+def source_line(path, line, files):
+    """
+    Returns the text of a line of a source file, or '' if the file cannot be read.
+
+    input: path: string, line: int, files: dict -> lines of the files read so far, by path
+    output: string
+    """
+    if path not in files:
+        try:
+            with open(path) as f:
+                files[path] = f.read().splitlines()
+        except OSError:
+            files[path] = []
+    lines = files[path]
+    return lines[line - 1].strip() if 0 < line <= len(lines) else ''
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolves lines of a generated file (ROM addresses of a .hack "
+                                                 "file) back to the .asm, .vm and .jack lines they came from.")
+    parser.add_argument('file', help="generated file (or its .map sidecar)")
+    parser.add_argument('positions', type=int, nargs='+', help="0-based lines, i.e. ROM addresses for .hack")
+    args = parser.parse_args()
+
+    source_map = SourceMap.load(args.file)
+    files = {}
+    for position in args.positions:
+        print(position)
+        for location in source_map.resolve(position):
+            if location is None:
+                print('    (no source)')
+            else:
+                filename, line = location
+                print(f'    {filename}:{line}  {source_line(os.path.join(source_map.directory, filename), line, files)}')
+
+if __name__ == "__main__":
+    main()
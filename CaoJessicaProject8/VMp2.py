@@ -7,6 +7,15 @@ COMMAND_TYPE = ["sub","add", "neg",  "eq", "gt", "lt", "and", "or", "not", "labe
 # Helper to generate unique labels for conditional commands (eq, gt, lt)
 label_counter = 0
 
+# Instruction sequences the peephole pass looks for: the end of every push, the start of every pop, and the
+# segments whose base address is held in a pointer register
+PUSH_TAIL = ["@SP", "AM=M+1", "A=A-1", "M=D"]
+POP_HEAD = ["@SP", "AM=M-1", "D=M"]
+POINTER_SEGMENTS = {"@LCL", "@ARG", "@THIS", "@THAT"}
+# Largest index that pop/push through a pointer rewrite to A=A+1 steps, while that is shorter than computing it
+MAX_POP_STEPS = 5
+MAX_PUSH_STEPS = 1
+
 
 def unique_label(base="LABEL"):
     """
@@ -19,37 +28,62 @@ def unique_label(base="LABEL"):
     label_counter += 1
     return label
 
-def translate_vm_to_asm(vm_files, asm_filename):
+def translate_vm_to_asm(vm_files, asm_filename, source_map=False, shared=False, optimize=False):
     """
     Utilizes helper functions to write the trandslated output of virtual machine language from the vm_files
     to a asm_filename.asm output file 
     input: 
         - vm_files - list[string] of the vm files names 
         - asm_filename - string of the output filename 
+        - source_map - bool, also write asm_filename.map with CaoJessicaProject6's SourceMap, composing in the maps
+          of the vm files
+        - shared - bool, translate call and return as jumps to one shared $CALL and $RETURN routine
+        - optimize - bool, run the peephole pass over the assembly before writing it
     Output: 
-        -None, but writes the translated vm file to asm_filename.asm 
+        - tuple[int, int] - number of instructions (labels not counted) before and after the peephole pass, and
+          writes the translated vm file to asm_filename.asm 
     """
     asm_instructions = []
-    
+    positions = []
 
-    asm_instructions.extend(generate_bootstrap_code())
+    asm_instructions.extend(generate_bootstrap_code(shared))
+    positions.extend([None] * len(asm_instructions))
     
-    for vm_filename in vm_files:
+    for index, vm_filename in enumerate(vm_files):
         basename = os.path.splitext(os.path.basename(vm_filename))[0]
-        asm_instructions.extend(translate_file(vm_filename, basename))
+        lines = []
+        asm_instructions.extend(translate_file(vm_filename, basename, lines, shared))
+        positions.extend((index, line) for line in lines)
+    if shared:
+        routines = generate_shared_routines()
+        asm_instructions.extend(routines)
+        positions.extend([None] * len(routines))
+    before = count_instructions(asm_instructions)
+    if optimize:
+        asm_instructions, positions = peephole(asm_instructions, positions)
 
     # Write the output to the .asm file
     with open(asm_filename, 'w') as file:
         file.write('\n'.join(asm_instructions) + '\n')
+    if source_map:
+        # The source map format lives with the assembler, so it is only needed when a map is asked for
+        project6 = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'CaoJessicaProject6')
+        if project6 not in sys.path:
+            sys.path.append(project6)
+        from SourceMap import SourceMap
+        SourceMap.build(asm_filename, vm_files, positions).save()
+    return before, count_instructions(asm_instructions)
 
 
-def translate_file(vm_filename, basename):
+def translate_file(vm_filename, basename, source_lines=None, shared=False):
     """
     Translates a single .vm file into assembly instructions.
 
     Inputs:
         string - vm_filename 
         string - basename the base name of the file (used for static variables)
+        list - source_lines, if given the vm line number of each assembly line is appended to it
+        bool - shared, call and return jump to the shared routines
     Returns:
         list[string] - assembly code lines
     """
@@ -58,23 +92,27 @@ def translate_file(vm_filename, basename):
     with open(vm_filename, 'r') as file:
         lines = file.readlines()
     
-    for line in lines:
+    for number, line in enumerate(lines, 1):
         line = line.strip()
         if not line or line.startswith('//'):
             continue
 
         command = line.split()
-        asm_instructions.extend(translate_command(command, basename))
+        translated = translate_command(command, basename, shared)
+        asm_instructions.extend(translated)
+        if source_lines is not None:
+            source_lines.extend([number] * len(translated))
 
     return asm_instructions
 
-def translate_command(command, basename):
+def translate_command(command, basename, shared=False):
     """
     Determines if the command is a push, pull, or arithmetic command and returns hack assembly code as a list 
     where each element is a line.
 
     input: list[string] - command
            string - basename
+           bool - shared, call and return jump to the shared routines
     returns list[string]
     """
     cmd_type = command[0]
@@ -93,16 +131,17 @@ def translate_command(command, basename):
     elif cmd_type == 'function':
         return translate_function(command[1], int(command[2]))
     elif cmd_type == 'call':
-        return translate_call(command[1], int(command[2]))
+        return translate_call(command[1], int(command[2]), shared)
     elif cmd_type == 'return':
-        return translate_return()
+        return translate_return(shared)
     else:
         return []
 
-def generate_bootstrap_code():
+def generate_bootstrap_code(shared=False):
     """
     Generates the bootstrap code to initialize the stack pointer and call Sys.init.
 
+    input: bool - shared, call Sys.init through the shared $CALL routine
     returns list[string] - the assembly instructions for the bootstrap code
     """
     instructions = [
@@ -112,9 +151,32 @@ def generate_bootstrap_code():
         "M=D"
     ]
     # Call Sys.init with 0 arguments
-    instructions.extend(translate_call("Sys.init", 0))
+    instructions.extend(translate_call("Sys.init", 0, shared))
     return instructions
 
+def generate_shared_routines():
+    """
+    Generates the $CALL and $RETURN routines that every call and return jumps to in shared mode, so the frame is
+    saved and restored by one copy of the code instead of one per call site. They go at the end of the program, so
+    nothing falls through into them.
+
+    $CALL expects the return address in D, n_args + 5 in R13 and the function's address in R14.
+
+    returns list[string] - assembly code
+    """
+    return [
+        "($CALL)",
+        "@SP", "AM=M+1", "A=A-1", "M=D",                   # Push return address
+        "@LCL", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D",    # Push LCL
+        "@ARG", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D",    # Push ARG
+        "@THIS", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D",   # Push THIS
+        "@THAT", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D",   # Push THAT
+        "@R13", "D=M", "@SP", "D=M-D", "@ARG", "M=D",      # ARG = SP - (n_args + 5)
+        "@SP", "D=M", "@LCL", "M=D",                       # LCL = SP
+        "@R14", "A=M", "0;JMP",                            # Jump to function
+        "($RETURN)",
+    ] + translate_return()
+
 def translate_function(func_name, n_vars):
     instructions = [f"({func_name})"]
     for _ in range(n_vars):
@@ -123,14 +185,23 @@ def translate_function(func_name, n_vars):
         ])
     return instructions
 
-def translate_call(func_name, n_args):
+def translate_call(func_name, n_args, shared=False):
     """
-    Translates a call command, setting up a new stack frame for the called function.
+    Translates a call command, setting up a new stack frame for the called function. With shared, the call site
+    only passes the return address, n_args and the function to the $CALL routine (12 instructions instead of 44).
 
-    input: string - func_name, int - n_args
+    input: string - func_name, int - n_args, bool - shared
     returns list[string] - assembly code
     """
     return_label = unique_label("RETURN")
+    if shared:
+        return [
+            f"@{n_args + 5}", "D=A", "@R13", "M=D",        # R13 = n_args + 5
+            f"@{func_name}", "D=A", "@R14", "M=D",         # R14 = function
+            f"@{return_label}", "D=A",                     # D = return address
+            "@$CALL", "0;JMP",
+            f"({return_label})"
+        ]
     instructions = [
         f"@{return_label}", "D=A", "@SP", "AM=M+1", "A=A-1", "M=D",  # Push return address
         "@LCL", "D=M", "@SP", "AM=M+1", "A=A-1", "M=D",              # Push LCL
@@ -144,12 +215,16 @@ def translate_call(func_name, n_args):
     ]
     return instructions
 
-def translate_return():
+def translate_return(shared=False):
     """
-    Translates a return command, restoring the caller's state and jumping to the return address.
+    Translates a return command, restoring the caller's state and jumping to the return address. With shared it is
+    a jump to the $RETURN routine.
 
+    input: bool - shared
     returns list[string] - assembly code
     """
+    if shared:
+        return ["@$RETURN", "0;JMP"]
     instructions = [
         "@LCL", "D=M", "@R13", "M=D",               # FRAME = LCL
         "@5", "A=D-A", "D=M", "@R14", "M=D",        # RET = *(FRAME-5)
@@ -387,8 +462,109 @@ def translate_arithmetic(command):
         ]
     return instructions
 
+def count_instructions(asm_instructions):
+    """
+    Counts the instructions that take up ROM, i.e. every line but the labels.
+
+    input: list[string] - asm_instructions
+    returns int
+    """
+    return sum(1 for instruction in asm_instructions if not instruction.startswith("("))
+
+def peephole_rule(window):
+    """
+    Tries the peephole rewrites on the instructions at the start of window. The translator's sequences leave nothing
+    in D or A that the next VM command reads, except what a push leaves in D, which is what the rules use.
+
+    input: list[string] - window, the instructions from the current position on
+    returns tuple[int, list[string]] - how many instructions to replace and what with, or None
+    """
+    # push x; pop y: the value is still in D after the push, so the stack round trip can go. If the pop is the
+    # start of a binary command, that command still needs A pointing at the top of the stack
+    if window[:7] == PUSH_TAIL + POP_HEAD:
+        if window[7:8] == ["A=A-1"]:
+            return 8, ["@SP", "A=M-1"]
+        if window[7:8] and window[7].startswith("@"):
+            return 7, []
+    # push x; neg/not works on D and writes the result on the stack directly
+    if window[:4] == PUSH_TAIL and window[4:6] == ["@SP", "A=M-1"] and window[6:7] in (["M=-M"], ["M=!M"]):
+        return 7, PUSH_TAIL[:3] + ["M=" + window[6][2] + "D"]
+    # push constant 0/1 into D without loading A, when the next instruction loads A anyway
+    if window[:2] in (["@0", "D=A"], ["@1", "D=A"]) and window[2:3] and window[2].startswith("@"):
+        return 2, ["D=" + window[0][1]]
+    # push constant 1; add/sub increments the top of the stack in place
+    if window[:4] == ["D=1", "@SP", "A=M-1", "M=D+M"]:
+        return 4, ["@SP", "A=M-1", "M=M+1"]
+    if window[:4] == ["D=1", "@SP", "A=M-1", "M=M-D"]:
+        return 4, ["@SP", "A=M-1", "M=M-1"]
+    # pop local/argument/this/that i: pop into D first, then step A from the base to the target
+    if window[:1] and window[0] in POINTER_SEGMENTS and window[1:2] == ["D=M"] and \
+            window[3:12] == ["D=D+A", "@R13", "M=D"] + POP_HEAD + ["@R13", "A=M", "M=D"]:
+        index = window[2][1:]
+        if index.isdigit() and int(index) <= MAX_POP_STEPS:
+            return 12, POP_HEAD + [window[0], "A=M"] + ["A=A+1"] * int(index) + ["M=D"]
+    # push local/argument/this/that i
+    if window[:1] and window[0] in POINTER_SEGMENTS and window[1:2] == ["D=M"] and window[3:5] == ["A=D+A", "D=M"]:
+        index = window[2][1:]
+        if index.isdigit() and int(index) <= MAX_PUSH_STEPS:
+            return 5, [window[0], "A=M"] + ["A=A+1"] * int(index) + ["D=M"]
+    # an A load that the next instruction overwrites
+    if window[:1] and window[0].startswith("@") and window[1:2] and window[1].startswith("@"):
+        return 1, []
+    return None
+
+def peephole(asm_instructions, positions=None):
+    """
+    Peephole optimizer for the translator's output. Slides over the instructions trying peephole_rule at each one,
+    and then drops A loads of the value A already holds (such as @SP reloads), repeating until nothing changes.
+    A replacement takes the source position of the last instruction it replaces.
+
+    input: list[string] - asm_instructions, list - positions, the source position of each instruction (optional)
+    returns tuple[list[string], list] - the optimized instructions and their positions
+    """
+    if positions is None:
+        positions = [None] * len(asm_instructions)
+    changed = True
+    while changed:
+        changed = False
+        instructions, kept = [], []
+        i = 0
+        while i < len(asm_instructions):
+            rule = peephole_rule(asm_instructions[i:i + 12])
+            if rule is None:
+                instructions.append(asm_instructions[i])
+                kept.append(positions[i])
+                i += 1
+                continue
+            length, replacement = rule
+            instructions.extend(replacement)
+            kept.extend([positions[i + length - 1]] * len(replacement))
+            i += length
+            changed = True
+
+        # A keeps its value until an instruction writes it; a label can be reached with any A
+        asm_instructions, positions = [], []
+        known = None
+        for instruction, position in zip(instructions, kept):
+            if instruction.startswith("("):
+                known = None
+            elif instruction.startswith("@"):
+                if instruction == known:
+                    changed = True
+                    continue
+                known = instruction
+            elif "A" in instruction.split("=")[0] and "=" in instruction:
+                known = None
+            asm_instructions.append(instruction)
+            positions.append(position)
+    return asm_instructions, positions
+
 if __name__ == "__main__":
-    vm_files = sys.argv[1:]
+    options = {'--source-map', '--shared', '--peephole'}
+    vm_files = [arg for arg in sys.argv[1:] if arg not in options]
     asm_filename = "Output.asm"
-    translate_vm_to_asm(vm_files, asm_filename)
+    before, after = translate_vm_to_asm(vm_files, asm_filename, '--source-map' in sys.argv[1:],
+                                        '--shared' in sys.argv[1:], '--peephole' in sys.argv[1:])
+    if before != after:
+        print(f"Peephole pass: {before} -> {after} instructions ({100 * (before - after) / before:.1f}% fewer)")
     print(f"Translation complete. Output written to {asm_filename}")